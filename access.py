@@ -0,0 +1,58 @@
+import logging
+from typing import Dict, Iterable, Optional
+
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+OWNER = 'owner'
+ADMIN = 'admin'
+
+
+class AccessControl:
+    """Who may use the bot, and how fast.
+
+    The ACL is a frozenset rebuilt by ``reload`` whenever the owner or the
+    admin list changes, so checking an update is one set lookup. Each
+    authorized user has a token bucket for commands; updates beyond the
+    rate are dropped before they reach a handler.
+
+    An admin list containing 0 means the bot is not set up yet and, as
+    before, everybody is treated as an admin.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.owner_id = 0
+        self.admins = frozenset()
+        self.setup_mode = False
+        self._buckets: Dict[int, TokenBucket] = {}
+
+    def reload(self, owner_id: int, admin_ids: Iterable[int]):
+        admins = frozenset(admin_ids)
+        self.setup_mode = 0 in admins
+        self.owner_id = owner_id
+        self.admins = (admins - {0}) | ({owner_id} if owner_id else frozenset())
+        # Forget the buckets of users who lost access
+        self._buckets = {user_id: bucket for user_id, bucket in self._buckets.items() if user_id in self.admins}
+
+    def role(self, user_id: int) -> Optional[str]:
+        if user_id == self.owner_id and user_id:
+            return OWNER
+        if user_id in self.admins or self.setup_mode:
+            return ADMIN
+        return None
+
+    def is_authorized(self, user_id: int) -> bool:
+        return self.setup_mode or user_id in self.admins
+
+    def allow(self, user_id: int) -> bool:
+        """Take one token from the user's bucket; False if they are over the rate."""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= 10000:
+                # Only reachable in setup mode, where anybody is let in
+                self._buckets.clear()
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+        return bucket.try_acquire()
@@ -0,0 +1,169 @@
+import logging
+import time
+from array import array
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HOUR = 'hour'
+DAY = 'day'
+WEEK = 'week'
+WINDOWS = (HOUR, DAY, WEEK)
+
+_MINUTES = 60  # Per-minute buckets: the last hour
+_HOURS = 24 * 7  # Per-hour buckets: the last week
+
+
+class RollingCounter:
+    """Hits of one keyword or chat over the last hour, day and week.
+
+    Two ring buffers of unsigned ints, one bucket per minute for the last
+    hour and one per hour for the last week (912 bytes in all). Buckets
+    that fell out of the window are zeroed lazily when the ring advances.
+    """
+
+    __slots__ = ('minutes', 'hours', 'minute', 'hour')
+
+    def __init__(self):
+        self.minutes = array('I', bytes(4 * _MINUTES))
+        self.hours = array('I', bytes(4 * _HOURS))
+        self.minute = 0  # Absolute index (minutes since the epoch) of the newest minute bucket
+        self.hour = 0
+
+    @staticmethod
+    def _advance(ring: array, last: int, current: int) -> int:
+        if current <= last:
+            return last
+        if current - last >= len(ring):
+            for i in range(len(ring)):
+                ring[i] = 0
+        else:
+            for index in range(last + 1, current + 1):
+                ring[index % len(ring)] = 0
+        return current
+
+    def _tick(self, now: float):
+        self.minute = self._advance(self.minutes, self.minute, int(now // 60))
+        self.hour = self._advance(self.hours, self.hour, int(now // 3600))
+
+    def add(self, at: float, now: float, count: int = 1):
+        """Count ``count`` hits at time ``at``; hits older than a week are ignored."""
+        self._tick(now)
+        minute = int(at // 60)
+        if 0 <= self.minute - minute < _MINUTES:
+            self.minutes[minute % _MINUTES] += count
+        hour = int(at // 3600)
+        if 0 <= self.hour - hour < _HOURS:
+            self.hours[hour % _HOURS] += count
+
+    def counts(self, now: float) -> Dict[str, int]:
+        """Hits in the last hour, day (24 hourly buckets) and week."""
+        self._tick(now)
+        day = sum(self.hours[(self.hour - i) % _HOURS] for i in range(24))
+        return {HOUR: sum(self.minutes), DAY: day, WEEK: sum(self.hours)}
+
+    def to_row(self) -> tuple:
+        return self.minute, self.hour, self.minutes.tobytes(), self.hours.tobytes()
+
+    @classmethod
+    def from_row(cls, minute: int, hour: int, minutes: bytes, hours: bytes) -> 'RollingCounter':
+        counter = cls()
+        counter.minute, counter.hour = minute, hour
+        counter.minutes = array('I', minutes)
+        counter.hours = array('I', hours)
+        if len(counter.minutes) != _MINUTES or len(counter.hours) != _HOURS:
+            raise ValueError("Counter buffer has the wrong size")
+        return counter
+
+
+class HitAnalytics:
+    """Rolling hit counters per keyword and per source chat.
+
+    Counters live in memory and are created on the first hit. Those changed
+    since the last save are handed out by ``dirty_rows`` so the caller can
+    write them in one batch.
+    """
+
+    KEYWORD = 'keyword'
+    CHAT = 'chat'
+
+    def __init__(self):
+        self.keywords: Dict[str, RollingCounter] = {}
+        self.chats: Dict[int, RollingCounter] = {}
+        self._dirty = set()
+
+    def _counter(self, kind: str, key: Hashable) -> RollingCounter:
+        counters = self.keywords if kind == self.KEYWORD else self.chats
+        counter = counters.get(key)
+        if counter is None:
+            counter = counters[key] = RollingCounter()
+        self._dirty.add((kind, key))
+        return counter
+
+    def record(self, chat_id: int, keywords: Iterable[str], at: Optional[float] = None):
+        """Count one matched message at time ``at`` (defaults to now)."""
+        now = time.time()
+        at = now if at is None else at
+        for keyword in keywords:
+            self._counter(self.KEYWORD, keyword).add(at, now)
+        self._counter(self.CHAT, chat_id).add(at, now)
+
+    def keyword_counts(self, keyword: str, now: Optional[float] = None) -> Dict[str, int]:
+        counter = self.keywords.get(keyword)
+        if counter is None:
+            return {window: 0 for window in WINDOWS}
+        return counter.counts(now or time.time())
+
+    def top(self, kind: str, window: str, limit: int = 10,
+            keys: Optional[Iterable[Hashable]] = None) -> List[Tuple[Hashable, int]]:
+        """The ``limit`` keywords or chats with the most hits in ``window``.
+
+        ``keys`` restricts the ranking, e.g. to the keywords still in use.
+        """
+        now = time.time()
+        counters = self.keywords if kind == self.KEYWORD else self.chats
+        if keys is not None:
+            counters = {key: counters[key] for key in keys if key in counters}
+        ranked = ((key, counter.counts(now)[window]) for key, counter in counters.items())
+        return sorted((item for item in ranked if item[1]), key=lambda item: -item[1])[:limit]
+
+    def silent_keywords(self, keywords: Iterable[str]) -> List[str]:
+        """Keywords without a single hit in the last week."""
+        now = time.time()
+        return [keyword for keyword in keywords if self.keyword_counts(keyword, now)[WEEK] == 0]
+
+    def retain_keywords(self, keywords: Iterable[str]):
+        """Forget the counters of keywords that were removed."""
+        keep = set(keywords)
+        for keyword in [keyword for keyword in self.keywords if keyword not in keep]:
+            del self.keywords[keyword]
+            self._dirty.discard((self.KEYWORD, keyword))
+
+    def dirty_rows(self) -> List[tuple]:
+        """``(kind, key, minute, hour, minutes, hours)`` of the counters changed since the last call."""
+        rows = []
+        for kind, key in self._dirty:
+            counters = self.keywords if kind == self.KEYWORD else self.chats
+            counter = counters.get(key)
+            if counter is not None:
+                rows.append((kind, str(key)) + counter.to_row())
+        self._dirty.clear()
+        return rows
+
+    def mark_dirty(self, rows: List[tuple]):
+        """Put rows whose save failed back, so the next save retries them."""
+        for kind, key, *_ in rows:
+            self._dirty.add((kind, key if kind == self.KEYWORD else int(key)))
+
+    def load(self, rows: Iterable[tuple]):
+        """Restore counters saved by an earlier run."""
+        for kind, key, minute, hour, minutes, hours in rows:
+            try:
+                counter = RollingCounter.from_row(minute, hour, minutes, hours)
+            except ValueError as e:
+                logger.warning(f"Skipping saved counter {kind} {key}: {str(e)}")
+                continue
+            if kind == self.KEYWORD:
+                self.keywords[key] = counter
+            else:
+                self.chats[int(key)] = counter
@@ -0,0 +1,153 @@
+"""Micro-benchmark for the keyword matching path of UserBot.keyword_monitor.
+
+Generates a synthetic stream of mixed Arabic/English messages with a
+configurable share of keyword hits, then measures normalization plus
+matching (exactly what keyword_monitor does per message) for several
+keyword list sizes.
+
+Usage:
+    python benchmarks/bench_matcher.py
+    python benchmarks/bench_matcher.py --sizes 10 1000 50000 --messages 20000 --hit-rate 0.05
+
+Results are printed and written as JSON (see --output) so runs can be
+compared to catch regressions.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matcher import KeywordMatcher  # noqa: E402
+from normalizer import normalize_text  # noqa: E402
+
+ARABIC_LETTERS = "ابتثجحخدذرزسشصضطظعغفقكلمنهوي"
+ARABIC_VARIANTS = "أإآىةؤئ"
+TASHKEEL = "ًٌٍَُِّْ"
+LATIN_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def random_word(rng: random.Random, arabic: bool) -> str:
+    if arabic:
+        letters = ARABIC_LETTERS + ARABIC_VARIANTS
+        word = "".join(rng.choice(letters) for _ in range(rng.randint(2, 7)))
+        # Some messages carry diacritics or tatweel, like real chat text
+        if rng.random() < 0.1:
+            word = word[0] + rng.choice(TASHKEEL) + word[1:]
+        if rng.random() < 0.05:
+            word = word[0] + "ـ" + word[1:]
+        return word
+    word = "".join(rng.choice(LATIN_LETTERS) for _ in range(rng.randint(2, 9)))
+    return word.capitalize() if rng.random() < 0.2 else word
+
+
+def make_keywords(rng: random.Random, count: int, arabic_share: float) -> list:
+    keywords = set()
+    while len(keywords) < count:
+        keywords.add(random_word(rng, rng.random() < arabic_share))
+    return sorted(keywords)
+
+
+def make_messages(rng: random.Random, keywords: list, count: int, hit_rate: float,
+                  arabic_share: float, min_words: int, max_words: int) -> list:
+    messages = []
+    for _ in range(count):
+        arabic = rng.random() < arabic_share
+        words = [random_word(rng, arabic) for _ in range(rng.randint(min_words, max_words))]
+        if rng.random() < hit_rate:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        messages.append(" ".join(words))
+    return messages
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_case(size: int, args, rng: random.Random) -> dict:
+    keywords = make_keywords(rng, size, args.arabic_share)
+    messages = make_messages(rng, keywords, args.messages, args.hit_rate,
+                             args.arabic_share, args.min_words, args.max_words)
+
+    tracemalloc.start()
+    build_started = time.perf_counter()
+    matcher = KeywordMatcher(keywords)
+    build_seconds = time.perf_counter() - build_started
+    matcher_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Warm up caches before timing
+    for message in messages[:100]:
+        matcher.find_all_normalized(message, normalize_text(message))
+
+    timings = []
+    matched = 0
+    clock = time.perf_counter_ns
+    run_started = time.perf_counter()
+    for message in messages:
+        started = clock()
+        hits = matcher.find_all_normalized(message, normalize_text(message))
+        timings.append(clock() - started)
+        if hits:
+            matched += 1
+    run_seconds = time.perf_counter() - run_started
+
+    timings.sort()
+    return {
+        'keywords': size,
+        'messages': len(messages),
+        'matched': matched,
+        'build_seconds': round(build_seconds, 4),
+        'matcher_memory_bytes': matcher_bytes,
+        'messages_per_second': round(len(messages) / run_seconds, 1),
+        'p50_us': round(percentile(timings, 0.50) / 1000, 2),
+        'p99_us': round(percentile(timings, 0.99) / 1000, 2),
+        'mean_us': round(statistics.fmean(timings) / 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 50000],
+                        help='keyword list sizes to benchmark')
+    parser.add_argument('--messages', type=int, default=20000, help='messages per size')
+    parser.add_argument('--hit-rate', type=float, default=0.05, help='share of messages containing a keyword')
+    parser.add_argument('--arabic-share', type=float, default=0.7, help='share of Arabic words/messages')
+    parser.add_argument('--min-words', type=int, default=3)
+    parser.add_argument('--max-words', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', default='bench_results.json', help='where to write the JSON results')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    print(f"{'keywords':>9} {'build s':>8} {'mem KiB':>9} {'msg/s':>10} {'p50 µs':>8} {'p99 µs':>8} {'hits':>6}")
+    for size in args.sizes:
+        result = run_case(size, args, rng)
+        results.append(result)
+        print(f"{result['keywords']:>9} {result['build_seconds']:>8} "
+              f"{result['matcher_memory_bytes'] // 1024:>9} {result['messages_per_second']:>10} "
+              f"{result['p50_us']:>8} {result['p99_us']:>8} {result['matched']:>6}")
+
+    report = {
+        'benchmark': 'matcher',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""Local stand-ins for Telegram, used by the load harness.
+
+- ``FakeTelegramClient`` replaces Telethon's TelegramClient inside UserBot.
+  It delivers synthetic NewMessage events to the registered handlers and
+  records everything that is sent.
+- ``FakeBotApi`` is a small HTTP server speaking enough of the Bot API
+  (getMe, getUpdates, sendMessage, ...) for python-telegram-bot to run
+  against it.
+
+Nothing here talks to the real Telegram servers.
+"""
+import asyncio
+import json
+import logging
+import ssl
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from telethon import events, utils
+from telethon.tl.types import InputPeerUser, User
+
+logger = logging.getLogger(__name__)
+
+
+class FakeMessage:
+    __slots__ = ('id', 'text', 'caption', 'photo', 'document', 'date')
+
+    def __init__(self, message_id: int, text: str):
+        self.id = message_id
+        self.text = text
+        self.date = datetime.now(timezone.utc).replace(microsecond=0)  # Telegram dates have 1s resolution
+        self.caption = None
+        self.photo = None
+        self.document = None
+
+
+class FakeNewMessage:
+    """The attributes of a NewMessage event that UserBot reads."""
+
+    def __init__(self, chat_id: int, message_id: int, text: str, sender: User):
+        self.chat_id = chat_id
+        self.is_private = False
+        self.message = FakeMessage(message_id, text)
+        self.sender = sender
+        self.sender_id = sender.id
+        self.input_sender = InputPeerUser(sender.id, 0)
+        self.chat = None
+        self.input_chat = None
+
+
+class FakeTelegramClient:
+    """Stand-in for TelegramClient that emits messages and records sends.
+
+    ``send_delay`` simulates the round trip of one send request.
+    """
+
+    def __init__(self, send_delay: float = 0.0):
+        self.send_delay = send_delay
+        self.me = User(id=1000, is_self=True, first_name='Load', username='loadtest')
+        self.handlers: List[tuple] = []
+        self.sent: List[tuple] = []  # (monotonic time, entity, text)
+        self.forwarded: List[tuple] = []  # (monotonic time, entity, message IDs, source)
+        self.edits = 0
+        self.connected = False
+        self._next_id = 0
+
+    async def start(self):
+        self.connected = True
+        return self
+
+    async def disconnect(self):
+        self.connected = False
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    async def get_me(self, input_peer: bool = False):
+        if input_peer:
+            return InputPeerUser(self.me.id, 0)
+        return self.me
+
+    def add_event_handler(self, callback, event=None):
+        self.handlers.append((callback, event))
+
+    @property
+    def message_handlers(self):
+        return [callback for callback, event in self.handlers if isinstance(event, events.NewMessage)]
+
+    async def iter_dialogs(self):
+        # An empty account: no groups to index
+        return
+        yield
+
+    async def get_entity(self, key):
+        if isinstance(key, int):
+            return utils.get_peer(key)
+        raise ValueError(f'Cannot find any entity corresponding to "{key}"')
+
+    async def get_input_entity(self, key):
+        return await self.get_entity(key)
+
+    async def send_message(self, entity, text, **kwargs):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self._next_id += 1
+        self.sent.append((time.monotonic(), entity, text))
+        return SimpleNamespace(id=self._next_id, message=text)
+
+    async def forward_messages(self, entity, messages, from_peer=None, **kwargs):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self.forwarded.append((time.monotonic(), entity, list(messages), from_peer))
+        result = []
+        for _ in messages:
+            self._next_id += 1
+            result.append(SimpleNamespace(id=self._next_id))
+        return result
+
+    async def edit_message(self, entity, message_id, text, **kwargs):
+        self.edits += 1
+        return SimpleNamespace(id=message_id, message=text)
+
+    async def __call__(self, request):
+        # Raw requests (GetUsersRequest, ...) find nothing
+        return []
+
+    async def emit(self, event):
+        """Run the NewMessage handlers for ``event``, one after the other like Telethon."""
+        event.client = self
+        for callback in self.message_handlers:
+            try:
+                await callback(event)
+            except Exception:
+                logger.exception("Handler failed")
+
+
+class FakeBotApi:
+    """Minimal Bot API server for python-telegram-bot.
+
+    Point the bot at it with ``ApplicationBuilder.base_url(api.base_url)``.
+    Updates added with ``push_message`` are returned by getUpdates, or
+    POSTed to the webhook (with its secret token) once setWebhook was called.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self.calls: Dict[str, int] = {}
+        self.sent_messages: List[dict] = []
+        self._updates: List[dict] = []
+        self._new_update = asyncio.Event()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self.webhook_statuses: List[int] = []
+        self._deliveries = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def push_message(self, user_id: int, text: str):
+        """Queue a private text message from ``user_id`` to the bot."""
+        message = {
+            'message_id': self._take_message_id(),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private', 'first_name': 'Load'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Load'},
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        update = {'update_id': self._next_update_id, 'message': message}
+        self._next_update_id += 1
+        if self.webhook_url:
+            task = asyncio.create_task(self._post_update(update))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+        else:
+            self._updates.append(update)
+            self._new_update.set()
+
+    async def _post_update(self, update: dict):
+        """Deliver one update to the webhook like Telegram does."""
+        url = urlsplit(self.webhook_url)
+        secure = url.scheme == 'https'
+        context = None
+        if secure:
+            # Local test certificates are usually self-signed
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        reader, writer = await asyncio.open_connection(
+            url.hostname, url.port or (443 if secure else 80), ssl=context
+        )
+        body = json.dumps(update).encode('utf-8')
+        headers = f"POST {url.path or '/'} HTTP/1.1\r\nHost: {url.netloc}\r\n"
+        headers += "Content-Type: application/json\r\n"
+        if self.webhook_secret:
+            headers += f"X-Telegram-Bot-Api-Secret-Token: {self.webhook_secret}\r\n"
+        headers += f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        try:
+            writer.write(headers.encode('latin-1') + body)
+            await writer.drain()
+            status_line = await reader.readline()
+            self.webhook_statuses.append(int(status_line.split()[1]))
+        finally:
+            writer.close()
+
+    def _take_message_id(self) -> int:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return message_id
+
+    async def _dispatch(self, method: str, params: dict):
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == 'getMe':
+            return {'id': 4242, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot',
+                    'can_join_groups': True, 'can_read_all_group_messages': False,
+                    'supports_inline_queries': False}
+        if method == 'getUpdates':
+            offset = int(params.get('offset') or 0)
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            if not self._updates:
+                # Long polling, shortened so shutdown is quick
+                self._new_update.clear()
+                try:
+                    await asyncio.wait_for(self._new_update.wait(), min(float(params.get('timeout') or 0), 1.0))
+                except asyncio.TimeoutError:
+                    pass
+            return list(self._updates)
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url')
+            self.webhook_secret = params.get('secret_token')
+            return True
+        if method == 'deleteWebhook':
+            self.webhook_url = self.webhook_secret = None
+            return True
+        if method in ('sendMessage', 'editMessageText'):
+            self.sent_messages.append(params)
+            return {
+                'message_id': self._take_message_id(),
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        # setMyCommands, deleteWebhook, answerCallbackQuery, close, ...
+        return True
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # python-telegram-bot keeps connections alive, so serve requests in a loop
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+
+                path = request_line.decode('latin-1').split()[1]
+                method = path.rstrip('/').rsplit('/', 1)[-1]
+                if headers.get('content-type', '').startswith('application/json'):
+                    params = json.loads(body or b'{}')
+                else:
+                    params = dict(parse_qsl(body.decode('utf-8')))
+
+                result = await self._dispatch(method, params)
+                payload = json.dumps({'ok': True, 'result': result}).encode('utf-8')
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode('latin-1') + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
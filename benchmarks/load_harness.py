@@ -0,0 +1,261 @@
+"""End-to-end load test of the userbot/bot pair against local stand-ins.
+
+Runs ``main.setup_and_run`` with a FakeTelegramClient in place of the
+Telethon client and a FakeBotApi server in place of api.telegram.org, feeds
+synthetic group messages at a fixed rate and measures how long it takes
+from a message arriving to its forward being sent.
+
+Usage:
+    python benchmarks/load_harness.py --rate 500 --duration 30 --keywords 1000
+
+All state files and the log are written to a temporary directory; the
+credentials are replaced with fake values so nothing reaches Telegram.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+TARGET_CHANNEL = -1001000000001
+OWNER_ID = 777
+TOKEN_PATTERN = re.compile(r'\[#(\d+)\]')
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def configure_environment(args):
+    """Fake credentials and a scratch working directory, before config is imported."""
+    workdir = tempfile.mkdtemp(prefix='userbot-load-')
+    os.environ.update({
+        'DATABASE_FILE': os.path.join(workdir, 'userbot.db'),
+        'API_ID': '1',
+        'API_HASH': 'fake',
+        'BOT_TOKEN': '123456:fake-token',
+        'TARGET_CHANNEL': str(TARGET_CHANNEL),
+        'OWNER_ID': str(OWNER_ID),
+        'METRICS_PORT': '0',
+    })
+    os.environ.setdefault('LOG_LEVEL', args.log_level)
+    if args.webhook:
+        # Telegram (the fake API) posts updates to the bot's own webhook server
+        os.environ.update({
+            'BOT_UPDATE_MODE': 'webhook',
+            'WEBHOOK_URL': f'http://127.0.0.1:{args.webhook_port}',
+            'WEBHOOK_LISTEN': '127.0.0.1',
+            'WEBHOOK_PORT': str(args.webhook_port),
+        })
+    os.chdir(workdir)
+    return workdir
+
+
+def seed_store(args):
+    """Seed the scratch database with synthetic keywords, before config is imported.
+
+    config then loads them from the store on import like in production.
+    """
+    from bench_matcher import make_keywords
+    from storage import Storage
+
+    keywords = make_keywords(random.Random(args.seed), args.keywords, 0.7)
+    store = Storage(os.environ['DATABASE_FILE'])
+    store.open()
+    # The scratch directory has no legacy JSON files, so the defaults given here are imported
+    store.import_legacy(os.path.abspath('keywords.json'), os.path.abspath('admins.json'), keywords, [OWNER_ID])
+    store.close()
+
+
+async def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+async def generate_load(client, args, keywords, senders, emitted):
+    """Emit ``rate`` messages per second for ``duration`` seconds; returns the expected matches.
+
+    Random filler words match keywords too, so every message is run through
+    the real matcher instead of counting only the inserted keywords.
+    """
+    from bench_matcher import random_word
+    from fakes import FakeNewMessage
+    from matcher import KeywordMatcher
+    from normalizer import normalize_text
+
+    matcher = KeywordMatcher(keywords)
+
+    rng = random.Random(args.seed)
+    chats = [-1002000000000 - i for i in range(args.chats)]
+    total = int(args.rate * args.duration)
+    interval = 1.0 / args.rate
+    expected = 0
+    started = time.monotonic()
+
+    for seq in range(total):
+        # Absolute schedule, so slow handlers show up as falling behind
+        delay = started + seq * interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        arabic = rng.random() < 0.7
+        words = [random_word(rng, arabic) for _ in range(rng.randint(3, 40))]
+        if rng.random() < args.hit_rate:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        text = f"[#{seq}] " + " ".join(words)
+        if matcher.find_all_normalized(text, normalize_text(text)):
+            expected += 1
+
+        event = FakeNewMessage(rng.choice(chats), seq + 1, text, rng.choice(senders))
+        emitted[seq] = time.monotonic()
+        await client.emit(event)
+
+    return expected, time.monotonic() - started
+
+
+async def run(args):
+    import config
+    import main
+    import metrics
+    from fakes import FakeBotApi, FakeTelegramClient
+    from telegram.ext import Application
+    from telethon.tl.types import User
+
+    keywords = config.KEYWORDS
+    # State files live next to config.py; keep the run's in the scratch directory
+    config.BROADCAST_STATE_FILE = os.path.abspath('broadcast_job.json')
+    config.DIALOG_INDEX_FILE = os.path.abspath('dialogs.json')
+    config.CHAT_FILTERS_FILE = os.path.abspath('chat_filters.json')
+
+    api = FakeBotApi()
+    await api.start()
+    client = FakeTelegramClient(send_delay=args.send_delay)
+
+    def application_builder():
+        return (
+            Application.builder()
+            .token(config.BOT_TOKEN)
+            .base_url(api.base_url)
+            .base_file_url(api.base_url)
+        )
+
+    app_task = asyncio.create_task(main.setup_and_run(lambda session_name: client, application_builder))
+    ready = await wait_for(
+        lambda: client.message_handlers and (api.calls.get('getUpdates') or api.webhook_url),
+        args.startup_timeout
+    )
+    if not ready:
+        app_task.cancel()
+        raise SystemExit("Clients did not start; see the log in the working directory")
+
+    senders = [User(id=5000 + i, first_name=f'Sender {i}', username=f'sender{i}') for i in range(100)]
+    emitted = {}
+    depth_samples = []
+
+    async def sample_queue_depth():
+        while True:
+            depth_samples.append(metrics.QUEUE_DEPTH.get())
+            await asyncio.sleep(0.1)
+
+    sampler = asyncio.create_task(sample_queue_depth())
+    forwards_before = len(client.sent)
+    expected, ingest_seconds = await generate_load(client, args, keywords, senders, emitted)
+    await wait_for(lambda: len(client.sent) - forwards_before >= expected, args.drain_timeout)
+    finished = time.monotonic()
+    sampler.cancel()
+
+    # The bot side should still answer commands under load
+    api.push_message(OWNER_ID, '/status')
+    replied = await wait_for(lambda: api.sent_messages, 10)
+
+    app_task.cancel()
+    try:
+        await app_task
+    except asyncio.CancelledError:
+        pass
+    await api.stop()
+    main.log_listener.stop()
+
+    latencies = []
+    for sent_at, _, text in client.sent[forwards_before:]:
+        token = TOKEN_PATTERN.search(text)
+        if token and int(token.group(1)) in emitted:
+            latencies.append(sent_at - emitted[int(token.group(1))])
+    latencies.sort()
+    total_messages = len(emitted)
+    elapsed = finished - min(emitted.values()) if emitted else 0.0
+
+    return {
+        'messages': total_messages,
+        'target_rate': args.rate,
+        'ingest_rate': round(total_messages / ingest_seconds, 1) if ingest_seconds else 0.0,
+        'expected_forwards': expected,
+        'forwards': len(latencies),
+        'forward_throughput': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'latency_p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'latency_p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'latency_max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        'max_queue_depth': max(depth_samples, default=0),
+        'match_p99_us': metrics.MATCH_SECONDS.quantile(0.99) * 1e6,
+        'event_loop_lag_ms': round(metrics.LOOP_LAG.get() * 1000, 2),
+        'bot_api_calls': api.calls,
+        'bot_replied_to_status': bool(replied),
+        'bot_update_mode': 'webhook' if api.webhook_url else 'polling',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=200, help='incoming messages per second')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load')
+    parser.add_argument('--keywords', type=int, default=1000)
+    parser.add_argument('--chats', type=int, default=50, help='number of source groups')
+    parser.add_argument('--hit-rate', type=float, default=0.05)
+    parser.add_argument('--send-delay', type=float, default=0.02, help='simulated latency of one send (s)')
+    parser.add_argument('--startup-timeout', type=float, default=30)
+    parser.add_argument('--drain-timeout', type=float, default=60)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--webhook', action='store_true', help='deliver bot updates through the webhook server')
+    parser.add_argument('--webhook-port', type=int, default=18443)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', default='load_results.json', help='where to write the JSON results')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+
+    workdir = configure_environment(args)
+    seed_store(args)
+    result = asyncio.run(run(args))
+
+    report = {
+        'benchmark': 'load',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'workdir': workdir,
+        'parameters': vars(args),
+        'result': result,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(result, indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
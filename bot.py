@@ -1,6 +1,14 @@
 import asyncio
+import csv
+import hashlib
+import io
 import json
+import logging
 import os
+import secrets
+import shlex
+import time
+from datetime import datetime
 from telegram import Update, BotCommand, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
@@ -8,28 +16,48 @@ from telegram.ext import (
     MessageHandler,
     ContextTypes,
     filters,
-    CallbackQueryHandler
+    CallbackQueryHandler,
+    TypeHandler,
+    ApplicationHandlerStop
 )
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
 
 import config
+import metrics
+from access import AccessControl
+from analytics import DAY, HOUR, WEEK, HitAnalytics
+from scanner import parse_since
 from typing import Callable, Awaitable, List
 
+logger = logging.getLogger(__name__)
+
 class TelegramBot:
-    def __init__(self, userbot):
-        """Initialize the official Telegram bot with python-telegram-bot."""
+    def __init__(self, userbot, application_builder=None):
+        """Initialize the official Telegram bot with python-telegram-bot.
+        
+        ``application_builder`` returns the ApplicationBuilder to build from;
+        by default it only sets config.BOT_TOKEN. The load harness uses it to
+        point the bot at a local fake Bot API server.
+        """
         self.application = None
         self.userbot = userbot  # Reference to the UserBot instance
+        self.application_builder = application_builder or self._create_builder
+        self.access = AccessControl(config.BOT_COMMAND_RATE, config.BOT_COMMAND_BURST)
+        self.reload_access()
+    
+    @staticmethod
+    def _create_builder():
+        return Application.builder().token(config.BOT_TOKEN)
         
     async def start(self):
         """Start the bot and set up command handlers."""
         try:
             # Create the Application with proper polling configuration
-            self.application = (
-                Application.builder()
-                .token(config.BOT_TOKEN)
-                .build()
-            )
+            self.application = self.application_builder().build()
+            
+            # Authorization and throttling run before every other handler
+            self.application.add_handler(TypeHandler(Update, self.auth_gate), group=-1)
             
             # Add command handlers
             self.application.add_handler(CommandHandler("start", self.cmd_start))
@@ -37,6 +65,12 @@ class TelegramBot:
             self.application.add_handler(CommandHandler("status", self.cmd_status))
             self.application.add_handler(CommandHandler("send", self.cmd_send_message))
             self.application.add_handler(CommandHandler("broadcast", self.cmd_broadcast))
+            self.application.add_handler(CommandHandler("broadcast_status", self.cmd_broadcast_status))
+            self.application.add_handler(CommandHandler("broadcast_cancel", self.cmd_broadcast_cancel))
+            self.application.add_handler(CommandHandler("search", self.cmd_search))
+            self.application.add_handler(CommandHandler("scan", self.cmd_scan))
+            self.application.add_handler(CommandHandler("scan_status", self.cmd_scan_status))
+            self.application.add_handler(CommandHandler("scan_cancel", self.cmd_scan_cancel))
             self.application.add_handler(CommandHandler("join", self.cmd_join))
             self.application.add_handler(CommandHandler("leave", self.cmd_leave))
             self.application.add_handler(CommandHandler("info", self.cmd_info))
@@ -45,6 +79,21 @@ class TelegramBot:
             self.application.add_handler(CommandHandler("addkeyword", self.cmd_add_keyword))
             self.application.add_handler(CommandHandler("listkeywords", self.cmd_list_keywords))
             self.application.add_handler(CommandHandler("deletekeyword", self.cmd_delete_keyword))
+            self.application.add_handler(CommandHandler("exportkeywords", self.cmd_export_keywords))
+            self.application.add_handler(MessageHandler(
+                filters.Document.FileExtension("txt") | filters.Document.FileExtension("csv"),
+                self.handle_keywords_document
+            ))
+            self.application.add_handler(CommandHandler("digest", self.cmd_digest))
+            self.application.add_handler(CommandHandler("metrics", self.cmd_metrics))
+            self.application.add_handler(CommandHandler("stats", self.cmd_stats))
+            
+            # Chat filtering commands
+            self.application.add_handler(CommandHandler("chatfilters", self.cmd_chat_filters))
+            self.application.add_handler(CommandHandler("allowchat", self.cmd_allow_chat))
+            self.application.add_handler(CommandHandler("denychat", self.cmd_deny_chat))
+            self.application.add_handler(CommandHandler("unfilterchat", self.cmd_unfilter_chat))
+            self.application.add_handler(CommandHandler("chatkeywords", self.cmd_chat_keywords))
 
             # Add admin management commands
             self.application.add_handler(CommandHandler("admins", self.cmd_admin_panel))
@@ -53,32 +102,84 @@ class TelegramBot:
             self.application.add_handler(CommandHandler("listadmins", self.cmd_list_admins))
             
             # Add callback handler for inline buttons
-            self.application.add_handler(CallbackQueryHandler(self.button_callback))
+            self.application.add_handler(CallbackQueryHandler(self.keywords_page_callback, pattern="^kw_"))
+            self.application.add_handler(CallbackQueryHandler(self.search_page_callback, pattern="^srch_"))
+            self.application.add_handler(CallbackQueryHandler(self.button_callback, pattern="^admin_"))
             
             # Add a handler for ANY message - this helps debug issues
             self.application.add_handler(MessageHandler(filters.ALL, self.handle_message))
             
+            # initialize() fetches the bot's own user once (bot.username/bot.id)
+            await self.application.initialize()
+            
             # Set up commands for the bot
             await self.setup_commands()
             
-            # Just initialize the bot (actual polling will be done in the main.py)
-            await self.application.initialize()
+            # Start dispatching; receiving updates is started by start_updates()
+            await self.application.start()
             
-            # Log startup message with bot username
-            me = await self.application.bot.get_me()
-            print(f"🟢 Bot @{me.username} has been initialized successfully")
+            logger.info(f"🟢 Bot @{self.application.bot.username} has been initialized successfully")
             
             return self.application
             
         except Exception as e:
-            print(f"❌ Error starting bot: {str(e)}")
+            logger.error(f"❌ Error starting bot: {str(e)}")
             raise e
     
+    async def start_updates(self):
+        """Start receiving updates and return the mode in use.
+        
+        With BOT_UPDATE_MODE=webhook updates are pushed by Telegram to the
+        webhook server embedded in python-telegram-bot; if it cannot be
+        started (missing extra, port in use, setWebhook rejected) the bot
+        falls back to long polling.
+        """
+        updater = self.application.updater
+        allowed_updates = ["message", "callback_query", "inline_query", "chat_member"]
+        
+        if config.BOT_UPDATE_MODE == 'webhook':
+            if not config.WEBHOOK_URL:
+                logger.error("❌ BOT_UPDATE_MODE is webhook but WEBHOOK_URL is not set; using polling")
+            else:
+                webhook_url = f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH}"
+                try:
+                    await updater.start_webhook(
+                        listen=config.WEBHOOK_LISTEN,
+                        port=config.WEBHOOK_PORT,
+                        url_path=config.WEBHOOK_PATH,
+                        webhook_url=webhook_url,
+                        secret_token=config.WEBHOOK_SECRET_TOKEN or secrets.token_urlsafe(32),
+                        cert=config.WEBHOOK_CERT,
+                        key=config.WEBHOOK_KEY,
+                        drop_pending_updates=True,
+                        allowed_updates=allowed_updates,
+                    )
+                    logger.info(f"🌐 Receiving updates via webhook {webhook_url} "
+                                f"(listening on {config.WEBHOOK_LISTEN}:{config.WEBHOOK_PORT})")
+                    return 'webhook'
+                except Exception as e:
+                    logger.error(f"❌ Could not start webhook, falling back to polling: {str(e)}")
+                    if updater.running:
+                        await updater.stop()
+        
+        await updater.start_polling(
+            poll_interval=config.BOT_POLL_INTERVAL,
+            timeout=config.BOT_POLL_TIMEOUT,
+            drop_pending_updates=True,
+            allowed_updates=allowed_updates,
+        )
+        logger.info("📡 Receiving updates via long polling")
+        return 'polling'
+    
     async def stop(self):
         """Stop the bot."""
         if self.application:
-            await self.application.stop()
-            print("🔴 Bot has been stopped.")
+            if self.application.updater and self.application.updater.running:
+                await self.application.updater.stop()
+            if self.application.running:
+                await self.application.stop()
+            await self.application.shutdown()
+            logger.info("🔴 Bot has been stopped.")
     
     async def setup_commands(self):
         """Set up bot commands in the menu."""
@@ -88,35 +189,65 @@ class TelegramBot:
             BotCommand("status", "التحقق من حالة اتصال الحساب الشخصي"),
             BotCommand("send", "إرسال رسالة (المعرف/الآيدي الرسالة)"),
             BotCommand("broadcast", "إرسال رسالة لكل المجموعات"),
+            BotCommand("broadcast_status", "عرض تقدم الإرسال الجماعي"),
+            BotCommand("broadcast_cancel", "إيقاف الإرسال الجماعي الجاري"),
+            BotCommand("search", "البحث في سجل الرسائل المطابقة"),
+            BotCommand("scan", "البحث في الرسائل السابقة (المجموعة أو all والمدة)"),
+            BotCommand("scan_status", "عرض تقدم البحث في الرسائل السابقة"),
+            BotCommand("scan_cancel", "إيقاف البحث في الرسائل السابقة"),
             BotCommand("join", "الانضمام إلى مجموعة أو قناة"),
             BotCommand("leave", "مغادرة مجموعة أو قناة"),
             BotCommand("info", "عرض معلومات المستخدم"),
-            BotCommand("addkeyword", "إضافة كلمة مفتاحية جديدة"),
+            BotCommand("addkeyword", "إضافة كلمة أو عدة كلمات مفتاحية"),
             BotCommand("listkeywords", "عرض قائمة الكلمات المفتاحية الحالية"),
-            BotCommand("deletekeyword", "حذف كلمة مفتاحية"),
+            BotCommand("deletekeyword", "حذف كلمة أو عدة كلمات مفتاحية"),
+            BotCommand("exportkeywords", "تصدير الكلمات المفتاحية كملف"),
+            BotCommand("digest", "تفعيل أو إيقاف وضع الملخص"),
+            BotCommand("metrics", "عرض إحصائيات الأداء"),
+            BotCommand("stats", "الكلمات والمجموعات الأكثر تطابقًا"),
+            BotCommand("chatfilters", "عرض فلاتر المجموعات"),
             BotCommand("admins", "إدارة المشرفين")
         ]
         
+        # The command list only changes with a deploy; skip the API call when
+        # the stored hash for this bot matches
+        digest = hashlib.sha256(
+            json.dumps([(c.command, c.description) for c in commands], ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        setting = f"bot_commands_hash:{self.application.bot.id}"
+        if config.STORE.get_setting(setting) == digest:
+            logger.info("✅ Bot commands unchanged, skipping set_my_commands")
+            return
+        
         await self.application.bot.set_my_commands(commands)
-        print("✅ Bot commands have been set up")
+        await config.STORE.set_setting(setting, digest)
+        logger.info("✅ Bot commands have been set up")
+    
+    def reload_access(self):
+        """Rebuild the ACL after the owner or the admin list changed."""
+        self.access.reload(config.OWNER_ID, config.ADMIN_IDS)
+    
+    async def auth_gate(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Drop updates from unauthorized or over-limit users before any handler runs.
+        
+        Dropped updates get no reply, so strangers cannot make the bot spend
+        API calls.
+        """
+        user = update.effective_user
+        if user is None or not self.access.is_authorized(user.id):
+            logger.debug(f"Dropped update {update.update_id} from unauthorized user {user.id if user else None}")
+            raise ApplicationHandlerStop
+        if not self.access.allow(user.id):
+            logger.debug(f"Dropped update {update.update_id} from user {user.id}: over the command rate")
+            raise ApplicationHandlerStop
     
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle all messages. Only respond to admins."""
+        """Handle all other messages (only admins get past auth_gate)."""
         if not update.effective_message:
             return
-
-        # Get user ID
-        user_id = update.effective_user.id
         
         # Log the message for debugging
-        print(f"📨 Received message from {user_id}: {update.effective_message.text}")
-        
-        # If user is not an admin, ignore the message
-        if user_id not in config.ADMIN_IDS and 0 not in config.ADMIN_IDS:
-            # Only respond to the /start command from non-admins for initial usage instructions
-            if update.effective_message.text and update.effective_message.text.startswith('/start'):
-                await update.effective_message.reply_text("⛔ هذا البوت للمسؤولين فقط. لا يمكنك استخدامه.")
-            return
+        logger.debug(f"📨 Received message from {update.effective_user.id}: {update.effective_message.text}")
             
         # Only handle non-command messages here (commands are handled by their specific handlers)
         if update.effective_message.text and not update.effective_message.text.startswith('/'):
@@ -127,9 +258,10 @@ class TelegramBot:
         user_id = update.effective_user.id
         
         # If OWNER_ID is 0, check if user is in admin list and this is initial setup
-        if config.OWNER_ID == 0 and (user_id in config.ADMIN_IDS or 0 in config.ADMIN_IDS):
+        if config.OWNER_ID == 0 and self.access.role(user_id) is not None:
             # First admin becomes owner
             config.OWNER_ID = user_id
+            self.reload_access()
             await update.message.reply_text(f"⚠️ لم يتم تعيين مالك للبوت من قبل. تم تعيينك كمالك (معرف: {user_id}).")
             return True
             
@@ -140,30 +272,22 @@ class TelegramBot:
         return True
     
     async def admin_required(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
-        """Check if the user is an admin."""
-        user_id = update.effective_user.id
-        # For debugging
-        print(f"👤 User ID: {user_id} | Admin IDs: {config.ADMIN_IDS} | Match: {user_id in config.ADMIN_IDS}")
+        """Check if the user is an admin.
         
+        auth_gate already dropped updates from everybody else; this is a
+        constant-time check kept as a second line of defence.
+        """
         # If ADMIN_IDS contains 0, accept any user (for initial setup)
-        if 0 in config.ADMIN_IDS:
+        if self.access.setup_mode:
             await update.message.reply_text("⚠️ لم يتم تكوين معرفات المسؤولين بعد. تم قبولك كمسؤول.")
             return True
-            
-        if user_id not in config.ADMIN_IDS:
-            await update.message.reply_text("⛔ أنت لست مسؤولًا. هذا الأمر متاح فقط للمسؤولين.")
-            return False
-        return True
+        
+        return self.access.role(update.effective_user.id) is not None
     
     async def cmd_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /start command."""
         user_id = update.effective_user.id
-        print(f"🚀 Start command received from user {user_id}")
-        
-        # Check if user is an admin
-        if user_id not in config.ADMIN_IDS and 0 not in config.ADMIN_IDS:
-            await update.message.reply_text("⛔ هذا البوت للمسؤولين فقط. لا يمكنك استخدامه.")
-            return
+        logger.info(f"🚀 Start command received from user {user_id}")
         
         await update.message.reply_text(
             "👋 مرحبًا بك في بوت التحكم بالحساب الشخصي!\n\n"
@@ -173,10 +297,10 @@ class TelegramBot:
         # For first-time setup, offer to set admin ID
         if 0 in config.ADMIN_IDS and len(config.ADMIN_IDS) == 1:
             # Setup first admin and owner
-            config.ADMIN_IDS.remove(0)
-            config.ADMIN_IDS.append(user_id)
+            config.ADMIN_IDS = [user_id]
             config.OWNER_ID = user_id
-            config.save_admins()
+            await config.save_admins()
+            self.reload_access()
             
             await update.message.reply_text(
                 f"🔧 تم تعيينك كمسؤول أول ومالك للبوت.\n"
@@ -195,13 +319,30 @@ class TelegramBot:
             "/status - التحقق من حالة اتصال الحساب الشخصي\n"
             "/send <username_or_id> <message> - إرسال رسالة لأي مستخدم أو مجموعة\n"
             "/broadcast <message> - إرسال رسالة لكل المجموعات المشترك بها الحساب\n"
+            "/broadcast_status - عرض تقدم الإرسال الجماعي\n"
+            "/broadcast_cancel - إيقاف الإرسال الجماعي الجاري\n"
+            "/search <query> [keyword] [since] - البحث في سجل الرسائل المطابقة (استخدم \"...\" لعبارة من عدة كلمات)\n"
+            "/scan <chat_id|all> <since> - البحث عن الكلمات المفتاحية في الرسائل السابقة (مثل 12h أو 7d أو 2024-05-01)\n"
+            "/scan_status - عرض تقدم البحث في الرسائل السابقة\n"
+            "/scan_cancel - إيقاف البحث في الرسائل السابقة\n"
             "/join <group_link> - الانضمام إلى مجموعة أو قناة\n"
             "/leave <chat_id> - مغادرة مجموعة أو قناة\n"
             "/info <username_or_id> - عرض معلومات المستخدم\n\n"
             "🔑 إدارة الكلمات المفتاحية:\n"
-            "/addkeyword <keyword> - إضافة كلمة مفتاحية جديدة\n"
+            "/addkeyword <keyword> [keyword...] - إضافة كلمة أو عدة كلمات (أو كلمة في كل سطر)\n"
             "/listkeywords - عرض قائمة الكلمات المفتاحية الحالية\n"
-            "/deletekeyword <keyword> - حذف كلمة مفتاحية\n\n"
+            "/deletekeyword <keyword> [keyword...] - حذف كلمة أو عدة كلمات\n"
+            "/exportkeywords - تصدير الكلمات المفتاحية كملف نصي\n"
+            "📎 أرسل ملف txt/csv لإضافة الكلمات التي فيه (أو مع التعليق /deletekeyword لحذفها)\n"
+            "/digest [on|off] [seconds] - تجميع الرسائل المطابقة في رسالة واحدة كل فترة\n"
+            "/metrics - عرض إحصائيات الأداء\n"
+            "/stats - الكلمات والمجموعات الأكثر تطابقًا والكلمات بدون أي تطابق\n\n"
+            "🎯 فلترة المجموعات:\n"
+            "/chatfilters - عرض المجموعات المسموحة والمستبعدة\n"
+            "/allowchat <chat_id> - مراقبة هذه المجموعة فقط (مع باقي المسموحة)\n"
+            "/denychat <chat_id> - إيقاف مراقبة مجموعة\n"
+            "/unfilterchat <chat_id> - إزالة مجموعة من القوائم\n"
+            "/chatkeywords <chat_id> [keywords...] - تحديد كلمات خاصة بمجموعة (بدون كلمات للإلغاء)\n\n"
             "👥 إدارة المشرفين (للمالك فقط):\n"
             "/admins - فتح لوحة إدارة المشرفين\n"
             "/addadmin <user_id> - إضافة مشرف جديد\n"
@@ -285,7 +426,8 @@ class TelegramBot:
                 await update.message.reply_text(f"⚠️ المستخدم {new_admin_id} مشرف بالفعل.")
                 return
                 
-            config.add_admin(new_admin_id)
+            await config.add_admin(new_admin_id)
+            self.reload_access()
             await update.message.reply_text(f"✅ تمت إضافة المستخدم {new_admin_id} كمشرف بنجاح.")
             
         except ValueError:
@@ -313,7 +455,8 @@ class TelegramBot:
                 await update.message.reply_text(f"⚠️ المستخدم {admin_id} ليس مشرفًا.")
                 return
                 
-            config.remove_admin(admin_id)
+            await config.remove_admin(admin_id)
+            self.reload_access()
             await update.message.reply_text(f"✅ تم حذف المستخدم {admin_id} من قائمة المشرفين بنجاح.")
             
         except ValueError:
@@ -375,9 +518,194 @@ class TelegramBot:
             
         message = " ".join(context.args)
         
+        async def report(job):
+            await update.message.reply_text(
+                f"✅ اكتمل الإرسال الجماعي: تم الإرسال إلى {job.sent} مجموعة/قناة، "
+                f"وفشل في {len(job.failed)}."
+            )
+        
         await update.message.reply_text("⏳ جاري إرسال الرسالة لكل المجموعات...")
-        result = await self.userbot.broadcast(message)
-        await update.message.reply_text(result)
+        result = await self.userbot.broadcast(message, on_done=report)
+        await update.message.reply_text(result + "\n\nاستخدم /broadcast_status لمتابعة التقدم.")
+    
+    async def cmd_broadcast_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /broadcast_status command to report broadcast progress."""
+        if not await self.admin_required(update, context):
+            return
+        
+        await update.message.reply_text(self.userbot.broadcast_status())
+    
+    async def cmd_broadcast_cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /broadcast_cancel command to stop the running broadcast."""
+        if not await self.admin_required(update, context):
+            return
+        
+        await update.message.reply_text(self.userbot.cancel_broadcast())
+    
+    async def cmd_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /stats command: top keywords and chats, and keywords that never fire."""
+        if not await self.admin_required(update, context):
+            return
+        
+        analytics = self.userbot.analytics
+        limit = config.STATS_TOP_N
+        keywords = config.KEYWORDS
+        lines = ["📊 إحصائيات التطابق"]
+        
+        for window, title in ((HOUR, "آخر ساعة"), (DAY, "آخر يوم"), (WEEK, "آخر أسبوع")):
+            top = analytics.top(HitAnalytics.KEYWORD, window, limit, keys=keywords)
+            lines.append(f"\n🔑 أكثر الكلمات تطابقًا ({title}):")
+            lines.extend(f"• {keyword}: {count}" for keyword, count in top)
+            if not top:
+                lines.append("—")
+        
+        top_chats = analytics.top(HitAnalytics.CHAT, WEEK, limit)
+        lines.append("\n💬 أكثر المجموعات تطابقًا (آخر أسبوع):")
+        lines.extend(
+            f"• {self.userbot.chat_title(chat_id) or chat_id} ({chat_id}): {count}" for chat_id, count in top_chats
+        )
+        if not top_chats:
+            lines.append("—")
+        
+        # Only keywords we have watched for a whole week can be called silent
+        started_at = config.STORE.get_setting('analytics_started_at') or time.time()
+        cutoff = time.time() - 7 * 86400
+        added_at = config.STORE.keywords_added_at()
+        silent = [
+            keyword for keyword in analytics.silent_keywords(keywords)
+            if max(started_at, added_at.get(keyword, 0)) <= cutoff
+        ]
+        lines.append(f"\n💤 كلمات بدون أي تطابق خلال أسبوع: {len(silent)}")
+        if silent:
+            shown = ", ".join(silent[:50])
+            lines.append(shown + (", …" if len(silent) > 50 else ""))
+            lines.append("يمكن حذفها بـ /deletekeyword لتسريع المطابقة.")
+        if started_at > cutoff:
+            since = datetime.fromtimestamp(started_at).strftime("%Y-%m-%d %H:%M")
+            lines.append(f"ℹ️ بدأ جمع الإحصائيات في {since}.")
+        
+        await update.message.reply_text("\n".join(lines)[:4096])
+    
+    async def _search_page(self, search, page):
+        """Render one page of search results with its navigation keyboard."""
+        query, keyword, since = search
+        page_size = config.SEARCH_PAGE_SIZE
+        page = max(page, 0)
+        
+        started = time.perf_counter()
+        results, has_more = await config.STORE.search_matches(
+            query, keyword, since, page_size, page * page_size, config.SEARCH_SCAN_LIMIT
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        if not results:
+            return ("⚠️ لا توجد نتائج." if page == 0 else "⚠️ لا توجد نتائج أخرى."), None
+        
+        lines = [f"🔎 نتائج البحث عن \"{query}\" (صفحة {page + 1}، {elapsed_ms:.0f} ms):\n"]
+        for i, match in enumerate(results, page * page_size + 1):
+            text = match['text'] if len(match['text']) <= 200 else match['text'][:200] + "…"
+            date = datetime.fromtimestamp(match['matched_at']).strftime("%Y-%m-%d %H:%M")
+            link = self.userbot.message_link(match['chat_id'], match['message_id']) or "غير متوفر"
+            lines.append(
+                f"{i}. 🕒 {date} | 💬 {match['chat_title'] or match['chat_id']}\n"
+                f"👤 {match['sender_name'] or match['sender_id']} | 🔑 {', '.join(match['keywords'])}\n"
+                f"📝 {text}\n"
+                f"🔗 {link}\n"
+            )
+        text = "\n".join(lines)[:4096]
+        
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton("◀️", callback_data=f"srch_page:{page - 1}"))
+        if has_more:
+            buttons.append(InlineKeyboardButton("▶️", callback_data=f"srch_page:{page + 1}"))
+        return text, InlineKeyboardMarkup([buttons]) if buttons else None
+    
+    async def cmd_search(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /search command to search the match history."""
+        if not await self.admin_required(update, context):
+            return
+        
+        # Quotes group several words into one query
+        text = self._command_text(update)
+        try:
+            args = shlex.split(text)
+        except ValueError:
+            args = text.split()
+        
+        since = None
+        if len(args) > 1:
+            try:
+                since = parse_since(args[-1])
+                args = args[:-1]
+            except ValueError:
+                pass
+        
+        if not 1 <= len(args) <= 2:
+            await update.message.reply_text(
+                "❌ الاستخدام الصحيح: /search <query> [keyword] [since]\n"
+                "مثال: /search \"سيارة للبيع\" سيارة 7d"
+            )
+            return
+        
+        # Remembered for the page buttons
+        search = (args[0], args[1] if len(args) == 2 else None, since)
+        context.user_data['search'] = search
+        text, reply_markup = await self._search_page(search, 0)
+        await update.message.reply_text(text, reply_markup=reply_markup)
+    
+    async def search_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Render the requested page of the last search when a navigation button is pressed."""
+        query = update.callback_query
+        await query.answer()
+        search = context.user_data.get('search')
+        if search is None:
+            return
+        
+        text, reply_markup = await self._search_page(search, int(query.data.split(":", 1)[1]))
+        try:
+            await query.edit_message_text(text=text, reply_markup=reply_markup)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+    
+    async def cmd_scan(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /scan command to look for keywords in past messages."""
+        if not await self.admin_required(update, context):
+            return
+        
+        # Check arguments
+        if len(context.args) != 2:
+            await update.message.reply_text(
+                "❌ الاستخدام الصحيح: /scan <chat_id|all> <since>\n"
+                "مثال: /scan all 7d أو /scan -1001234567890 2024-05-01"
+            )
+            return
+        
+        target, since = context.args
+        
+        async def report(job):
+            await update.message.reply_text(
+                f"✅ اكتمل البحث في الرسائل السابقة: تم فحص {job.scanned} رسالة "
+                f"في {len(job.done)} مجموعة/قناة، ووُجدت {job.matched} رسالة مطابقة."
+            )
+        
+        result = await self.userbot.scan_history(target, since, on_done=report)
+        await update.message.reply_text(result + "\n\nاستخدم /scan_status لمتابعة التقدم.")
+    
+    async def cmd_scan_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /scan_status command to report scan progress."""
+        if not await self.admin_required(update, context):
+            return
+        
+        await update.message.reply_text(self.userbot.scan_status())
+    
+    async def cmd_scan_cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /scan_cancel command to stop the running scan."""
+        if not await self.admin_required(update, context):
+            return
+        
+        await update.message.reply_text(self.userbot.cancel_scan())
     
     async def cmd_join(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle the /join command to join a group or channel."""
@@ -427,77 +755,356 @@ class TelegramBot:
         result = await self.userbot.get_user_info(user)
         await update.message.reply_text(result)
         
+    @staticmethod
+    def _parse_keywords(text):
+        """Split command text into keywords.
+        
+        One keyword per line or comma separated; a single line without
+        commas is split on whitespace.
+        """
+        text = text.replace('،', ',')
+        if '\n' in text or ',' in text:
+            parts = text.replace('\n', ',').split(',')
+        else:
+            parts = text.split()
+        return list(dict.fromkeys(part.strip() for part in parts if part.strip()))
+    
+    @staticmethod
+    def _command_text(update: Update):
+        """Text after the command, keeping line breaks (context.args loses them)."""
+        text = update.message.text or ""
+        parts = text.split(maxsplit=1)
+        return parts[1] if len(parts) > 1 else ""
+    
+    async def _add_keywords(self, keywords):
+        """Store keywords in one transaction and rebuild the matcher once."""
+        added = await config.STORE.add_keywords(keywords)
+        if added:
+            await self.userbot.reload_keywords()
+        return added
+    
+    async def _remove_keywords(self, keywords):
+        """Remove keywords in one transaction and rebuild the matcher once."""
+        removed = await config.STORE.remove_keywords(keywords)
+        if removed:
+            await self.userbot.reload_keywords()
+        return removed
+    
     async def cmd_add_keyword(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle the /addkeyword command to add a new keyword to monitor."""
+        """Handle the /addkeyword command to add one or many keywords to monitor."""
         if not await self.admin_required(update, context):
             return
         
-        # Check arguments
-        if len(context.args) != 1:
-            await update.message.reply_text("❌ الاستخدام الصحيح: /addkeyword <keyword>")
-            return
-            
-        keyword = context.args[0].strip()
-        
-        # Check if keyword already exists
-        if keyword in config.KEYWORDS:
-            await update.message.reply_text(f"⚠️ الكلمة المفتاحية '{keyword}' موجودة بالفعل.")
+        keywords = self._parse_keywords(self._command_text(update))
+        if not keywords:
+            await update.message.reply_text(
+                "❌ الاستخدام الصحيح: /addkeyword <keyword> [keyword...]\n"
+                "أو كلمة في كل سطر، أو أرسل ملف txt/csv"
+            )
             return
         
-        # Add keyword to config
-        config.KEYWORDS.append(keyword)
-        
-        # Save to keywords file for persistence
         try:
-            self._save_keywords_to_file()
-            await update.message.reply_text(f"✅ تمت إضافة الكلمة المفتاحية '{keyword}' بنجاح.")
+            added = await self._add_keywords(keywords)
         except Exception as e:
             await update.message.reply_text(f"❌ حدث خطأ أثناء حفظ الكلمة المفتاحية: {str(e)}")
+            return
+        
+        if len(keywords) == 1:
+            if added:
+                await update.message.reply_text(f"✅ تمت إضافة الكلمة المفتاحية '{keywords[0]}' بنجاح.")
+            else:
+                await update.message.reply_text(f"⚠️ الكلمة المفتاحية '{keywords[0]}' موجودة بالفعل.")
+            return
+        await update.message.reply_text(
+            f"✅ تمت إضافة {len(added)} كلمة مفتاحية.\n"
+            f"⚠️ {len(keywords) - len(added)} موجودة بالفعل."
+        )
+    
+    def _keywords_page(self, page):
+        """Render one page of the keyword list with its navigation keyboard."""
+        keywords = config.KEYWORDS
+        page_size = config.KEYWORDS_PAGE_SIZE
+        pages = max(1, -(-len(keywords) // page_size))
+        page = min(max(page, 0), pages - 1)
+        
+        first = page * page_size
+        analytics = self.userbot.analytics
+        now = time.time()
+        lines = [f"🔑 الكلمات المفتاحية الحالية ({len(keywords)})، وعدد التطابقات خلال ساعة/يوم/أسبوع:\n"]
+        for i, keyword in enumerate(keywords[first:first + page_size], first + 1):
+            counts = analytics.keyword_counts(keyword, now)
+            lines.append(f"{i}. {keyword} — {counts[HOUR]}/{counts[DAY]}/{counts[WEEK]}")
+        text = "\n".join(lines)[:4096]
+        
+        if pages == 1:
+            return text, None
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton("◀️", callback_data=f"kw_page:{page - 1}"))
+        buttons.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="kw_noop"))
+        if page < pages - 1:
+            buttons.append(InlineKeyboardButton("▶️", callback_data=f"kw_page:{page + 1}"))
+        return text, InlineKeyboardMarkup([buttons])
     
     async def cmd_list_keywords(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle the /listkeywords command to list all monitored keywords."""
+        """Handle the /listkeywords command; long lists are paginated."""
         if not await self.admin_required(update, context):
             return
         
         if not config.KEYWORDS:
             await update.message.reply_text("⚠️ لا توجد كلمات مفتاحية محددة حاليًا.")
             return
-            
-        keywords_text = "🔑 الكلمات المفتاحية الحالية:\n\n"
-        for i, keyword in enumerate(config.KEYWORDS, 1):
-            keywords_text += f"{i}. {keyword}\n"
-            
-        await update.message.reply_text(keywords_text)
+        
+        text, reply_markup = self._keywords_page(0)
+        await update.message.reply_text(text, reply_markup=reply_markup)
+    
+    async def keywords_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Render the requested keyword page when a navigation button is pressed."""
+        query = update.callback_query
+        await query.answer()
+        if query.data == "kw_noop":
+            return
+        
+        text, reply_markup = self._keywords_page(int(query.data.split(":", 1)[1]))
+        try:
+            await query.edit_message_text(text=text, reply_markup=reply_markup)
+        except BadRequest as e:
+            # Pressing the button of the page already shown
+            if "not modified" not in str(e).lower():
+                raise
         
     async def cmd_delete_keyword(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle the /deletekeyword command to remove a keyword."""
+        """Handle the /deletekeyword command to remove one or many keywords."""
         if not await self.admin_required(update, context):
             return
         
-        # Check arguments
-        if len(context.args) != 1:
-            await update.message.reply_text("❌ الاستخدام الصحيح: /deletekeyword <keyword>")
+        keywords = self._parse_keywords(self._command_text(update))
+        if not keywords:
+            await update.message.reply_text("❌ الاستخدام الصحيح: /deletekeyword <keyword> [keyword...]")
+            return
+        
+        try:
+            removed = await self._remove_keywords(keywords)
+        except Exception as e:
+            await update.message.reply_text(f"❌ حدث خطأ أثناء حذف الكلمة المفتاحية: {str(e)}")
+            return
+        
+        if len(keywords) == 1:
+            if removed:
+                await update.message.reply_text(f"✅ تم حذف الكلمة المفتاحية '{keywords[0]}' بنجاح.")
+            else:
+                await update.message.reply_text(f"⚠️ الكلمة المفتاحية '{keywords[0]}' غير موجودة.")
+            return
+        await update.message.reply_text(
+            f"✅ تم حذف {len(removed)} كلمة مفتاحية.\n"
+            f"⚠️ {len(keywords) - len(removed)} غير موجودة."
+        )
+    
+    async def cmd_export_keywords(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /exportkeywords command: send all keywords as a text file."""
+        if not await self.admin_required(update, context):
             return
-            
-        keyword = context.args[0].strip()
         
-        # Check if keyword exists
-        if keyword not in config.KEYWORDS:
-            await update.message.reply_text(f"⚠️ الكلمة المفتاحية '{keyword}' غير موجودة.")
+        data = "\n".join(config.KEYWORDS).encode('utf-8')
+        await update.message.reply_document(
+            document=data,
+            filename="keywords.txt",
+            caption=f"🔑 {len(config.KEYWORDS)} كلمة مفتاحية"
+        )
+    
+    async def handle_keywords_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Import keywords from an uploaded .txt/.csv file.
+        
+        One keyword per line (first column for CSV). With the caption
+        /deletekeyword the listed keywords are removed instead.
+        """
+        if not await self.admin_required(update, context):
             return
         
-        # Remove keyword from config
-        config.KEYWORDS.remove(keyword)
+        document = update.message.document
+        if document.file_size and document.file_size > config.KEYWORDS_FILE_MAX_BYTES:
+            await update.message.reply_text("❌ الملف كبير جدًا.")
+            return
         
-        # Save to keywords file for persistence
         try:
-            self._save_keywords_to_file()
-            await update.message.reply_text(f"✅ تم حذف الكلمة المفتاحية '{keyword}' بنجاح.")
+            telegram_file = await document.get_file()
+            content = bytes(await telegram_file.download_as_bytearray()).decode('utf-8-sig')
         except Exception as e:
-            await update.message.reply_text(f"❌ حدث خطأ أثناء حذف الكلمة المفتاحية: {str(e)}")
-            
-    def _save_keywords_to_file(self):
-        """Save keywords to a file for persistence."""
-        keywords_file = "keywords.json"
-        with open(keywords_file, 'w', encoding='utf-8') as f:
-            json.dump(config.KEYWORDS, f, ensure_ascii=False, indent=2) 
\ No newline at end of file
+            await update.message.reply_text(f"❌ تعذر قراءة الملف: {str(e)}")
+            return
+        
+        if (document.file_name or "").lower().endswith(".csv"):
+            rows = csv.reader(io.StringIO(content))
+            keywords = [row[0].strip() for row in rows if row and row[0].strip()]
+        else:
+            keywords = [line.strip() for line in content.splitlines() if line.strip()]
+        keywords = list(dict.fromkeys(keywords))
+        if not keywords:
+            await update.message.reply_text("⚠️ لم يتم العثور على كلمات مفتاحية في الملف.")
+            return
+        
+        try:
+            if (update.message.caption or "").startswith("/deletekeyword"):
+                removed = await self._remove_keywords(keywords)
+                await update.message.reply_text(
+                    f"✅ تم حذف {len(removed)} كلمة مفتاحية من أصل {len(keywords)} في الملف."
+                )
+            else:
+                added = await self._add_keywords(keywords)
+                await update.message.reply_text(
+                    f"✅ تمت إضافة {len(added)} كلمة مفتاحية من أصل {len(keywords)} في الملف."
+                )
+        except Exception as e:
+            await update.message.reply_text(f"❌ حدث خطأ أثناء حفظ الكلمات المفتاحية: {str(e)}")
+    
+    async def cmd_metrics(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /metrics command to show throughput and latency metrics."""
+        if not await self.admin_required(update, context):
+            return
+        
+        await update.message.reply_text(metrics.summary_text())
+    
+    async def cmd_digest(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /digest command to toggle digest mode at runtime."""
+        if not await self.admin_required(update, context):
+            return
+        
+        # Without arguments just report the current mode
+        if not context.args:
+            state = "مفعل" if self.userbot.digest_enabled else "متوقف"
+            await update.message.reply_text(
+                f"📦 وضع الملخص: {state}\n"
+                f"⏱ مدة التجميع: {self.userbot.digest.window:g} ثانية\n\n"
+                "الاستخدام: /digest <on|off> [seconds]"
+            )
+            return
+        
+        mode = context.args[0].lower()
+        if mode not in ("on", "off") or len(context.args) > 2:
+            await update.message.reply_text("❌ الاستخدام الصحيح: /digest <on|off> [seconds]")
+            return
+        
+        window = None
+        if len(context.args) == 2:
+            try:
+                window = float(context.args[1])
+                if window <= 0:
+                    raise ValueError
+            except ValueError:
+                await update.message.reply_text("❌ يجب أن تكون المدة رقمًا موجبًا بالثواني.")
+                return
+        
+        await self.userbot.set_digest_mode(mode == "on", window)
+        if mode == "on":
+            await update.message.reply_text(
+                f"✅ تم تفعيل وضع الملخص. سيتم إرسال الرسائل المطابقة مجمعة كل {self.userbot.digest.window:g} ثانية."
+            )
+        else:
+            await update.message.reply_text("✅ تم إيقاف وضع الملخص. سيتم إرسال كل رسالة مطابقة على حدة.")
+    
+    async def _parse_chat_id(self, update: Update, target: str):
+        """Resolve a chat ID or username argument, replying on failure."""
+        try:
+            return await self.userbot.resolve_chat_id(target)
+        except Exception as e:
+            await update.message.reply_text(f"❌ تعذر العثور على المجموعة '{target}': {str(e)}")
+            return None
+    
+    async def cmd_chat_filters(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /chatfilters command to show the chat allow/deny lists and scopes."""
+        if not await self.admin_required(update, context):
+            return
+        
+        filters_ = self.userbot.chat_filters
+        allow = "\n".join(f"• {chat_id}" for chat_id in sorted(filters_.allow)) or "— (كل المجموعات)"
+        deny = "\n".join(f"• {chat_id}" for chat_id in sorted(filters_.deny)) or "—"
+        scopes = "\n".join(
+            f"• {chat_id}: {', '.join(keywords)}" for chat_id, keywords in filters_.scopes.items()
+        ) or "—"
+        
+        await update.message.reply_text(
+            f"✅ المجموعات المسموحة:\n{allow}\n\n"
+            f"⛔ المجموعات المستبعدة:\n{deny}\n\n"
+            f"🔑 كلمات خاصة بمجموعات:\n{scopes}"
+        )
+    
+    async def cmd_allow_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /allowchat command to add a chat to the allow list."""
+        if not await self.admin_required(update, context):
+            return
+        
+        if len(context.args) != 1:
+            await update.message.reply_text("❌ الاستخدام الصحيح: /allowchat <chat_id>")
+            return
+        
+        chat_id = await self._parse_chat_id(update, context.args[0])
+        if chat_id is None:
+            return
+        
+        self.userbot.chat_filters.allow_chat(chat_id)
+        await update.message.reply_text(
+            f"✅ تمت إضافة {chat_id} إلى المجموعات المسموحة. سيتم مراقبة المجموعات المسموحة فقط."
+        )
+    
+    async def cmd_deny_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /denychat command to stop monitoring a chat."""
+        if not await self.admin_required(update, context):
+            return
+        
+        if len(context.args) != 1:
+            await update.message.reply_text("❌ الاستخدام الصحيح: /denychat <chat_id>")
+            return
+        
+        chat_id = await self._parse_chat_id(update, context.args[0])
+        if chat_id is None:
+            return
+        
+        self.userbot.chat_filters.deny_chat(chat_id)
+        await update.message.reply_text(f"✅ تم إيقاف مراقبة المجموعة {chat_id}.")
+    
+    async def cmd_unfilter_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /unfilterchat command to remove a chat from the allow/deny lists."""
+        if not await self.admin_required(update, context):
+            return
+        
+        if len(context.args) != 1:
+            await update.message.reply_text("❌ الاستخدام الصحيح: /unfilterchat <chat_id>")
+            return
+        
+        chat_id = await self._parse_chat_id(update, context.args[0])
+        if chat_id is None:
+            return
+        
+        if self.userbot.chat_filters.clear_chat(chat_id):
+            await update.message.reply_text(f"✅ تمت إزالة {chat_id} من قوائم الفلترة.")
+        else:
+            await update.message.reply_text(f"⚠️ المجموعة {chat_id} غير موجودة في قوائم الفلترة.")
+    
+    async def cmd_chat_keywords(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle the /chatkeywords command to set or clear a chat's keyword subset."""
+        if not await self.admin_required(update, context):
+            return
+        
+        if len(context.args) < 1:
+            await update.message.reply_text("❌ الاستخدام الصحيح: /chatkeywords <chat_id> [keywords...]")
+            return
+        
+        chat_id = await self._parse_chat_id(update, context.args[0])
+        if chat_id is None:
+            return
+        
+        keywords = [keyword.strip() for keyword in context.args[1:] if keyword.strip()]
+        unknown = self.userbot.chat_filters.set_scope(chat_id, keywords, config.KEYWORDS)
+        scoped = [keyword for keyword in dict.fromkeys(keywords) if keyword not in unknown]
+        if keywords and not scoped:
+            await update.message.reply_text(
+                f"❌ لم يتم تغيير كلمات المجموعة {chat_id}، هذه الكلمات غير موجودة في قائمة الكلمات المفتاحية: "
+                f"{', '.join(unknown)}"
+            )
+        elif keywords:
+            reply = f"✅ سيتم البحث في المجموعة {chat_id} عن هذه الكلمات فقط: {', '.join(scoped)}"
+            if unknown:
+                reply += f"\n⚠️ تم تجاهل كلمات غير موجودة في قائمة الكلمات المفتاحية: {', '.join(unknown)}"
+            await update.message.reply_text(reply)
+        else:
+            await update.message.reply_text(f"✅ ستستخدم المجموعة {chat_id} كل الكلمات المفتاحية.")
@@ -0,0 +1,243 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from telethon.errors import FloodWaitError, SlowModeWaitError
+
+import metrics
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastJob:
+    """A broadcast of one message to a fixed list of chats.
+
+    The job description is written once to ``state_file``; every finished
+    chat is appended to a journal next to it, so a restarted process can
+    pick up exactly where the previous one stopped without resending.
+    """
+
+    def __init__(self, job_id: str, message: str, targets: List[int],
+                 created_at: Optional[float] = None, status: str = 'running'):
+        self.job_id = job_id
+        self.message = message
+        self.targets = targets
+        self.created_at = created_at or time.time()
+        self.status = status
+        self.sent = 0
+        self.failed: Dict[int, str] = {}
+        self.done = set()
+
+    @property
+    def total(self) -> int:
+        return len(self.targets)
+
+    @property
+    def remaining(self) -> int:
+        return self.total - len(self.done)
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.job_id,
+            'message': self.message,
+            'targets': self.targets,
+            'created_at': self.created_at,
+            'status': self.status,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'BroadcastJob':
+        return cls(data['job_id'], data['message'], data['targets'],
+                   data.get('created_at'), data.get('status', 'running'))
+
+    def progress_text(self) -> str:
+        """Human readable progress summary."""
+        elapsed = int(time.time() - self.created_at)
+        return (f"📣 Broadcast {self.job_id} ({self.status})\n"
+                f"Sent: {self.sent}/{self.total} | Failed: {len(self.failed)} | "
+                f"Remaining: {self.remaining}\n"
+                f"Elapsed: {elapsed // 60}m {elapsed % 60}s")
+
+
+class BroadcastEngine:
+    """Run broadcasts in the background with rate limiting and resumable state.
+
+    Sends are paced by a token bucket shared by ``concurrency`` worker tasks.
+    A FloodWait or slow-mode wait only delays the chat it happened in: that
+    chat is re-queued after the requested time while the others carry on.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[int, str], Awaitable[None]],
+        state_file: str,
+        rate: float = 2.0,
+        burst: float = 5.0,
+        concurrency: int = 4,
+        max_flood_wait: float = 300.0,
+        max_attempts: int = 3,
+    ):
+        self._send = send
+        self.state_file = state_file
+        self.journal_file = state_file + '.journal'
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = max(1, concurrency)
+        self.max_flood_wait = max_flood_wait
+        self.max_attempts = max_attempts
+        self.job: Optional[BroadcastJob] = None
+        self._task: Optional[asyncio.Task] = None
+        self._journal = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start_job(self, message: str, targets: List[int],
+                  on_done: Optional[Callable[[BroadcastJob], Awaitable[None]]] = None) -> BroadcastJob:
+        """Persist a new job and start sending it in the background."""
+        if self.running:
+            raise RuntimeError("A broadcast is already running")
+
+        job = BroadcastJob(uuid.uuid4().hex[:8], message, list(dict.fromkeys(targets)))
+        # The old journal goes first: a crash in between must not leave the new
+        # job's state next to the old job's sent chats
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self._write_state(job)
+        self._launch(job, on_done)
+        return job
+
+    def resume(self, on_done: Optional[Callable[[BroadcastJob], Awaitable[None]]] = None) -> Optional[BroadcastJob]:
+        """Resume an interrupted job from disk, if there is one."""
+        if self.running or not os.path.exists(self.state_file):
+            return None
+
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                job = BroadcastJob.from_dict(json.load(f))
+        except Exception as e:
+            logger.error(f"Could not load broadcast state: {str(e)}")
+            return None
+
+        self._load_journal(job)
+        self.job = job
+        if job.status != 'running':
+            return None
+
+        logger.info(f"Resuming broadcast {job.job_id}: {job.remaining} of {job.total} chats left")
+        self._launch(job, on_done)
+        return job
+
+    def cancel(self) -> bool:
+        """Stop the running job; it will not be resumed."""
+        if not self.running:
+            return False
+        self.job.status = 'cancelled'
+        self._task.cancel()
+        return True
+
+    async def stop(self):
+        """Pause the running job for shutdown; it resumes on the next start."""
+        if self.running:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def progress_text(self) -> str:
+        if self.job is None:
+            return "No broadcast has been started yet."
+        return self.job.progress_text()
+
+    def _launch(self, job: BroadcastJob, on_done):
+        self.job = job
+        self._task = asyncio.create_task(self._run(job, on_done), name=f"broadcast-{job.job_id}")
+
+    def _write_state(self, job: BroadcastJob):
+        # Write to a temporary file first so a crash never leaves a truncated state file
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(job.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_file, self.state_file)
+
+    def _load_journal(self, job: BroadcastJob):
+        if not os.path.exists(self.journal_file):
+            return
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                chat_id, _, error = line.rstrip('\n').partition('\t')
+                try:
+                    chat_id = int(chat_id)
+                except ValueError:
+                    continue  # A partially written last line
+                job.done.add(chat_id)
+                if error:
+                    job.failed[chat_id] = error
+                else:
+                    job.sent += 1
+
+    def _record(self, job: BroadcastJob, chat_id: int, error: str = ""):
+        job.done.add(chat_id)
+        if error:
+            job.failed[chat_id] = error
+        else:
+            job.sent += 1
+        self._journal.write(f"{chat_id}\t{error}\n")
+        self._journal.flush()
+
+    async def _run(self, job: BroadcastJob, on_done):
+        queue: asyncio.Queue = asyncio.Queue()
+        for chat_id in job.targets:
+            if chat_id not in job.done:
+                queue.put_nowait(chat_id)
+
+        attempts: Dict[int, int] = {}
+        finished = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        if job.remaining == 0:
+            finished.set()
+
+        async def worker():
+            while True:
+                chat_id = await queue.get()
+                await self.bucket.acquire()
+                try:
+                    await self._send(chat_id, job.message)
+                    self._record(job, chat_id)
+                except (FloodWaitError, SlowModeWaitError) as e:
+                    metrics.FLOOD_WAITS.inc()
+                    attempts[chat_id] = attempts.get(chat_id, 0) + 1
+                    if e.seconds > self.max_flood_wait or attempts[chat_id] >= self.max_attempts:
+                        self._record(job, chat_id, f"flood wait {e.seconds}s")
+                    else:
+                        # Only this chat waits; the other workers keep going
+                        loop.call_later(e.seconds, queue.put_nowait, chat_id)
+                        continue
+                except Exception as e:
+                    self._record(job, chat_id, str(e) or e.__class__.__name__)
+                if job.remaining == 0:
+                    finished.set()
+
+        self._journal = open(self.journal_file, 'a', encoding='utf-8')
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            await finished.wait()
+            job.status = 'done'
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._journal.close()
+            self._journal = None
+            # A shutdown leaves the job as 'running' so that it is resumed
+            self._write_state(job)
+
+        logger.info(f"Broadcast {job.job_id} finished: {job.sent} sent, {len(job.failed)} failed")
+        if on_done is not None:
+            try:
+                await on_done(job)
+            except Exception as e:
+                logger.error(f"Error reporting broadcast result: {str(e)}")
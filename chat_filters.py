@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+
+from matcher import KeywordMatcher
+from normalizer import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class ChatFilters:
+    """Which chats are monitored, and which keywords apply in each of them.
+
+    - ``deny``: chats that are never scanned.
+    - ``allow``: if not empty, only these chats are scanned.
+    - ``scopes``: optional per-chat keyword subsets. A scoped chat is only
+      matched against its own subset (restricted to the global keyword list).
+
+    Lookups are O(1) set/dict lookups. Every change replaces the sets and the
+    compiled per-chat matchers wholesale, so the message handler never sees
+    a half-updated state.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.allow = frozenset()
+        self.deny = frozenset()
+        self.scopes: Dict[int, tuple] = {}
+        self._matchers: Dict[int, KeywordMatcher] = {}
+
+    def is_monitored(self, chat_id: int) -> bool:
+        if chat_id in self.deny:
+            return False
+        return not self.allow or chat_id in self.allow
+
+    def matcher_for(self, chat_id: int) -> Optional[KeywordMatcher]:
+        """The scoped matcher for ``chat_id``, or None to use the global one."""
+        return self._matchers.get(chat_id)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Could not load chat filters: {str(e)}")
+            return
+        self.allow = frozenset(int(chat_id) for chat_id in data.get('allow', []))
+        self.deny = frozenset(int(chat_id) for chat_id in data.get('deny', []))
+        self.scopes = {int(chat_id): tuple(keywords) for chat_id, keywords in data.get('scopes', {}).items()}
+
+    def save(self):
+        data = {
+            'allow': sorted(self.allow),
+            'deny': sorted(self.deny),
+            'scopes': {str(chat_id): list(keywords) for chat_id, keywords in self.scopes.items()},
+        }
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.path)
+
+    @staticmethod
+    def build_matchers(scopes: Dict[int, tuple], keywords: Iterable[str]) -> Dict[int, KeywordMatcher]:
+        """Compile ``scopes`` against a global keyword list; touches no shared state."""
+        known = {normalize_text(keyword) for keyword in keywords}
+        return {
+            chat_id: KeywordMatcher(k for k in scoped if normalize_text(k) in known)
+            for chat_id, scoped in scopes.items()
+        }
+
+    def set_matchers(self, scopes: Dict[int, tuple], matchers: Dict[int, KeywordMatcher]) -> bool:
+        """Install matchers built from ``scopes``, unless the scopes were replaced since."""
+        if scopes is not self.scopes:
+            return False
+        self._matchers = matchers
+        return True
+
+    def rebuild(self, keywords: Iterable[str]):
+        """Recompile the per-chat matchers against the current global keyword list."""
+        self._matchers = self.build_matchers(self.scopes, keywords)
+
+    def allow_chat(self, chat_id: int):
+        self.deny = self.deny - {chat_id}
+        self.allow = self.allow | {chat_id}
+        self.save()
+
+    def deny_chat(self, chat_id: int):
+        self.allow = self.allow - {chat_id}
+        self.deny = self.deny | {chat_id}
+        self.save()
+
+    def clear_chat(self, chat_id: int) -> bool:
+        """Remove a chat from the allow and deny lists. Returns True if it was listed."""
+        listed = chat_id in self.allow or chat_id in self.deny
+        self.allow = self.allow - {chat_id}
+        self.deny = self.deny - {chat_id}
+        self.save()
+        return listed
+
+    def set_scope(self, chat_id: int, keywords: List[str], all_keywords: Iterable[str]) -> List[str]:
+        """Limit ``chat_id`` to ``keywords``; an empty list removes the scope.
+
+        Only keywords in ``all_keywords`` are kept. Returns the unknown ones;
+        if none of ``keywords`` is known the scope is left unchanged, since an
+        empty scope would never match.
+        """
+        all_keywords = list(all_keywords)
+        known_forms = {normalize_text(keyword) for keyword in all_keywords}
+        known, unknown = [], []
+        for keyword in dict.fromkeys(keywords):
+            (known if normalize_text(keyword) in known_forms else unknown).append(keyword)
+        if keywords and not known:
+            return unknown
+
+        scopes = dict(self.scopes)
+        if known:
+            scopes[chat_id] = tuple(known)
+        else:
+            scopes.pop(chat_id, None)
+        self.scopes = scopes
+        self.rebuild(all_keywords)
+        self.save()
+        return unknown
@@ -1,15 +1,27 @@
 import os
-import json
+import logging
 from dotenv import load_dotenv
 from typing import List, Dict, Any
 
+from storage import Storage
+
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Telethon (UserBot) credentials
 API_ID = int(os.getenv('API_ID', 0))
 API_HASH = os.getenv('API_HASH', '')
 
+# Telethon session names, comma separated. Several sessions share the
+# monitoring and sending load; the first one is the primary account.
+USERBOT_SESSIONS = [name.strip() for name in os.getenv('USERBOT_SESSIONS', 'userbot_session').split(',') if name.strip()]
+# Sends per second and burst size each session is given before another
+# session with more spare budget is preferred
+SESSION_SEND_RATE = float(os.getenv('SESSION_SEND_RATE', 1))
+SESSION_SEND_BURST = float(os.getenv('SESSION_SEND_BURST', 5))
+
 # Official Bot credentials
 # Hardcoded token as fallback
 BOT_TOKEN = os.getenv('BOT_TOKEN', '') or '7365699658:AAEWrOYPJ8cUXevK69YUjCit3OrN95ixlfM'
@@ -31,92 +43,90 @@ owner_id_str = os.getenv('OWNER_ID', '0')
 try:
     OWNER_ID = int(owner_id_str)
 except ValueError:
-    print(f"Warning: Invalid owner ID format: {owner_id_str}")
+    logger.warning(f"Invalid owner ID format: {owner_id_str}")
     OWNER_ID = 0
 
-# Admin IDs list file path
-ADMINS_FILE = "admins.json"
+# SQLite database holding keywords, admins, settings and match history.
+# Relative paths are resolved against the project directory, not the CWD.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_FILE = os.path.join(BASE_DIR, os.getenv('DATABASE_FILE', 'userbot.db'))
+# Matches are written to the history in batches collected over this many seconds
+MATCH_HISTORY_FLUSH_DELAY = float(os.getenv('MATCH_HISTORY_FLUSH_DELAY', 1))
+STORE = Storage(DATABASE_FILE, match_flush_delay=MATCH_HISTORY_FLUSH_DELAY)
+STORE.open()
+
+# Files used before the database; imported once on the first start
+ADMINS_FILE = os.path.join(BASE_DIR, "admins.json")
+KEYWORDS_FILE = os.path.join(BASE_DIR, "keywords.json")
 
 # Admin user IDs who can control the bot
 # Support for multiple admins
 ADMIN_IDS = []
 
-# Load admins from file if it exists
-def load_admins():
-    global ADMIN_IDS
-    try:
-        if os.path.exists(ADMINS_FILE):
-            with open(ADMINS_FILE, 'r', encoding='utf-8') as f:
-                admins = json.load(f)
-                # Ensure all admins are integers
-                ADMIN_IDS = [int(admin_id) for admin_id in admins]
-                return
-    except Exception as e:
-        print(f"Error loading admin IDs: {str(e)}")
-    
-    # If file doesn't exist or error loading, check environment variables
+# Admins from the environment, used for a new database without admins.json
+def initial_admins() -> List[int]:
+    admin_ids = []
     admin_ids_str = os.getenv('ADMIN_IDS', '')
     if admin_ids_str:
         # Split by commas if multiple IDs are provided
         for admin_id in admin_ids_str.split(','):
             try:
-                ADMIN_IDS.append(int(admin_id.strip()))
+                admin_ids.append(int(admin_id.strip()))
             except ValueError:
-                print(f"Warning: Invalid admin ID format: {admin_id}")
+                logger.warning(f"Invalid admin ID format: {admin_id}")
 
     # For backward compatibility - also check the single ADMIN_ID
     single_admin_id = os.getenv('ADMIN_ID', '0')
     if single_admin_id and single_admin_id.strip() != '0':
         try:
             single_id = int(single_admin_id.strip())
-            if single_id not in ADMIN_IDS:
-                ADMIN_IDS.append(single_id)
+            if single_id not in admin_ids:
+                admin_ids.append(single_id)
         except ValueError:
-            print(f"Warning: Invalid admin ID format: {single_admin_id}")
+            logger.warning(f"Invalid admin ID format: {single_admin_id}")
 
     # Always include the owner in admin list if specified
-    if OWNER_ID != 0 and OWNER_ID not in ADMIN_IDS:
-        ADMIN_IDS.append(OWNER_ID)
+    if OWNER_ID != 0 and OWNER_ID not in admin_ids:
+        admin_ids.append(OWNER_ID)
 
     # If no admin IDs are specified, default to 0 (allows initial setup)
-    if not ADMIN_IDS:
-        ADMIN_IDS = [0]
-    
-    # Save initial admin list to file
-    save_admins()
-
-# Save admin IDs to file
-def save_admins():
-    try:
-        with open(ADMINS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(ADMIN_IDS, f, ensure_ascii=False, indent=2)
-        print(f"✅ Admin IDs saved to {ADMINS_FILE}")
-    except Exception as e:
-        print(f"❌ Error saving admin IDs: {str(e)}")
+    return admin_ids or [0]
+
+# Load admins from the database
+def load_admins():
+    global ADMIN_IDS
+    ADMIN_IDS = STORE.admins()
+
+# The admin functions below replace ADMIN_IDS instead of mutating it, so
+# code reading the list never sees it half-updated
+
+# Save the whole admin list
+async def save_admins():
+    await STORE.set_admins(ADMIN_IDS)
+    logger.info(f"Admin IDs saved to {DATABASE_FILE}")
 
 # Add a new admin
-def add_admin(user_id: int) -> bool:
+async def add_admin(user_id: int) -> bool:
+    global ADMIN_IDS
     if user_id in ADMIN_IDS:
         return False  # Already an admin
-    ADMIN_IDS.append(user_id)
-    save_admins()
+    await STORE.add_admin(user_id)
+    ADMIN_IDS = ADMIN_IDS + [user_id]
     return True
 
 # Remove an admin
-def remove_admin(user_id: int) -> bool:
+async def remove_admin(user_id: int) -> bool:
+    global ADMIN_IDS
     if user_id == OWNER_ID:
         return False  # Cannot remove owner
     if user_id not in ADMIN_IDS:
         return False  # Not an admin
-    ADMIN_IDS.remove(user_id)
-    save_admins()
+    await STORE.remove_admin(user_id)
+    ADMIN_IDS = [admin_id for admin_id in ADMIN_IDS if admin_id != user_id]
     return True
 
-# Initialize admin IDs
-load_admins()
-
 # Keywords to monitor in groups
-# Default keywords that are always included
+# Default keywords for a new database
 DEFAULT_KEYWORDS = [
     'عاجل',
     'خصم',
@@ -124,26 +134,19 @@ DEFAULT_KEYWORDS = [
     'حصري',
 ]
 
-# Load keywords from file if it exists
-def load_keywords():
-    keywords_file = "keywords.json"
-    try:
-        if os.path.exists(keywords_file):
-            with open(keywords_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else:
-            # If file doesn't exist, use default keywords and create the file
-            with open(keywords_file, 'w', encoding='utf-8') as f:
-                json.dump(DEFAULT_KEYWORDS, f, ensure_ascii=False, indent=2)
-            return DEFAULT_KEYWORDS
-    except Exception as e:
-        print(f"Error loading keywords: {str(e)}")
-        return DEFAULT_KEYWORDS
-
-# Initialize keywords from file or defaults
+# Load keywords from the database
+def load_keywords() -> List[str]:
+    return STORE.keywords()
+
+# A new database is seeded from the old JSON files or the defaults
+STORE.import_legacy(KEYWORDS_FILE, ADMINS_FILE, DEFAULT_KEYWORDS, initial_admins())
+
+# Initialize admins and keywords from the database
+load_admins()
 KEYWORDS = load_keywords()
 
 # Advanced settings
+# Available fields: message, sender_name, username, user_id, chat_title, message_link, date
 MESSAGE_FORWARD_FORMAT = """
 📬 رسالة جديدة تحتوي على كلمة مفتاحية:
 
@@ -157,6 +160,140 @@ MESSAGE_FORWARD_FORMAT = """
 📅 {date}
 """
 
+# Digest mode: coalesce matches into one message per window instead of one per match
+DIGEST_MODE = os.getenv('DIGEST_MODE', 'false').lower() in ('1', 'true', 'yes', 'on')
+DIGEST_WINDOW = float(os.getenv('DIGEST_WINDOW', 10))
+
+DIGEST_HEADER = "📬 ملخص الرسائل المطابقة:\n\n"
+
+DIGEST_ENTRY_FORMAT = """🔑 {keyword} | 👤 {sender_name} ({username})
+📝 {message}
+🔗 {message_link}"""
+
+# Maximum length of the message excerpt in a digest entry
+DIGEST_MESSAGE_PREVIEW = 300
+
+# Forward mode: 'text' sends each match rendered with MESSAGE_FORWARD_FORMAT,
+# 'native' forwards the original messages (media included), batching the
+# matches from one source chat into a single request per window
+FORWARD_MODE = os.getenv('FORWARD_MODE', 'text').lower()
+NATIVE_FORWARD_WINDOW = float(os.getenv('NATIVE_FORWARD_WINDOW', 2))
+# In native mode each batch gets one reply with a line per match (empty to disable)
+# Available fields: keyword, sender_name, username, user_id, chat_title, message_link
+NATIVE_FORWARD_NOTE_FORMAT = os.getenv('NATIVE_FORWARD_NOTE_FORMAT', "🔑 {keyword} | 👤 {sender_name} ({username})")
+
+# Seconds between checks for keyword/admin changes made outside this process
+# (database commits by other instances, edits to keywords.json); 0 disables
+HOT_RELOAD_INTERVAL = float(os.getenv('HOT_RELOAD_INTERVAL', 2))
+
+# Bot commands each admin may send: sustained rate per second and burst size;
+# updates beyond that are dropped before any handler runs
+BOT_COMMAND_RATE = float(os.getenv('BOT_COMMAND_RATE', 1))
+BOT_COMMAND_BURST = float(os.getenv('BOT_COMMAND_BURST', 10))
+
+# Rolling hit counters per keyword/chat are saved to the database this often (seconds)
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv('ANALYTICS_FLUSH_INTERVAL', 60))
+# Entries per ranking shown by /stats
+STATS_TOP_N = int(os.getenv('STATS_TOP_N', 10))
+
+# Results shown per page by /search
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 10))
+# Without SQLite FTS5, /search scans only this many of the newest matches
+SEARCH_SCAN_LIMIT = int(os.getenv('SEARCH_SCAN_LIMIT', 100000))
+
+# Keywords shown per page by /listkeywords
+KEYWORDS_PAGE_SIZE = int(os.getenv('KEYWORDS_PAGE_SIZE', 50))
+# Largest keyword file accepted for bulk import (bytes)
+KEYWORDS_FILE_MAX_BYTES = int(os.getenv('KEYWORDS_FILE_MAX_BYTES', 5 * 1024 * 1024))
+
+# Broadcasts run in the background and are resumed after a restart
+BROADCAST_STATE_FILE = os.path.join(BASE_DIR, "broadcast_job.json")
+# Sends per second and burst size of the broadcast token bucket
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', 2))
+BROADCAST_BURST = float(os.getenv('BROADCAST_BURST', 5))
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 4))
+# Chats asking us to wait longer than this (seconds) are marked as failed
+BROADCAST_MAX_FLOOD_WAIT = float(os.getenv('BROADCAST_MAX_FLOOD_WAIT', 300))
+
+# History scans (/scan) are checkpointed in the database after every batch
+# and resumed after a restart; batches per second limit their request rate
+SCAN_BATCH_SIZE = int(os.getenv('SCAN_BATCH_SIZE', 100))
+SCAN_RATE = float(os.getenv('SCAN_RATE', 1))
+# Forward past matches like live ones, or only add them to the match history
+SCAN_FORWARD = os.getenv('SCAN_FORWARD', 'true').lower() in ('1', 'true', 'yes', 'on')
+
+# Groups/channels the UserBot is in, kept current from membership updates
+# (one file per session; extra sessions get dialogs_<session>.json)
+DIALOG_INDEX_FILE = os.path.join(BASE_DIR, "dialogs.json")
+
+# Chat allow/deny lists and per-chat keyword subsets for monitoring
+CHAT_FILTERS_FILE = os.path.join(BASE_DIR, "chat_filters.json")
+
+# Duplicate suppression: the same content cross-posted to several groups is
+# forwarded once and the forward is later edited to show how often it was seen
+DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'true').lower() in ('1', 'true', 'yes', 'on')
+DEDUP_WINDOW = float(os.getenv('DEDUP_WINDOW', 3600))
+DEDUP_MAX_ENTRIES = int(os.getenv('DEDUP_MAX_ENTRIES', 5000))
+# Seconds to wait before editing the hit count into a forward (at most one edit per period)
+DEDUP_EDIT_DELAY = float(os.getenv('DEDUP_EDIT_DELAY', 30))
+
+DEDUP_ANNOTATION = "\n🔁 تكررت هذه الرسالة {count} مرة في {chats} مجموعة"
+
+# Number of senders/chats whose names are kept for enriching forwarded matches
+METADATA_CACHE_SIZE = int(os.getenv('METADATA_CACHE_SIZE', 10000))
+
+# Resolved entity cache (chats and usernames looked up by the UserBot)
+ENTITY_CACHE_SIZE = int(os.getenv('ENTITY_CACHE_SIZE', 1000))
+ENTITY_CACHE_TTL = float(os.getenv('ENTITY_CACHE_TTL', 3600))
+
+# Forwarding queue: matches are queued and delivered by a pool of workers
+FORWARD_WORKERS = int(os.getenv('FORWARD_WORKERS', 2))
+FORWARD_QUEUE_SIZE = int(os.getenv('FORWARD_QUEUE_SIZE', 1000))
+FORWARD_MAX_RETRIES = int(os.getenv('FORWARD_MAX_RETRIES', 3))
+# Seconds to wait for queued matches to be delivered on shutdown
+FORWARD_DRAIN_TIMEOUT = float(os.getenv('FORWARD_DRAIN_TIMEOUT', 10))
+
+# How the bot receives updates: 'polling' (default) or 'webhook'.
+# Webhook mode falls back to polling if the webhook cannot be started.
+BOT_UPDATE_MODE = os.getenv('BOT_UPDATE_MODE', 'polling').lower()
+# Long polling: pause between requests and how long each getUpdates waits
+BOT_POLL_INTERVAL = float(os.getenv('BOT_POLL_INTERVAL', 0))
+BOT_POLL_TIMEOUT = int(os.getenv('BOT_POLL_TIMEOUT', 30))
+# Webhook: public base URL Telegram posts to (e.g. https://example.com:8443),
+# the local address/port and path served, and the secret token Telegram must
+# send back (a random one is generated per start if empty)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram-webhook').strip('/')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '')
+# Optional TLS for the webhook server; a self-signed certificate is uploaded to Telegram
+WEBHOOK_CERT = os.getenv('WEBHOOK_CERT', '') or None
+WEBHOOK_KEY = os.getenv('WEBHOOK_KEY', '') or None
+
+# Prometheus metrics endpoint (bound to localhost); set METRICS_PORT=0 to disable
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9464))
+
+# Logging
+LOG_FILE = os.getenv('LOG_FILE', 'telegram_bot.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Per-subsystem levels, e.g. "telegram=WARNING,httpx=WARNING,userbot.matches=INFO"
+LOG_LEVELS = {
+    name.strip(): level.strip().upper()
+    for name, _, level in (
+        item.partition('=')
+        for item in os.getenv('LOG_LEVELS', 'telegram=WARNING,httpx=WARNING,httpcore=WARNING,telethon=INFO').split(',')
+    )
+    if name.strip() and level.strip()
+}
+# Size based rotation, or time based if LOG_ROTATE_WHEN is set (e.g. "midnight")
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')
+# Write the log file as JSON lines (one record per line)
+LOG_JSON = os.getenv('LOG_JSON', 'false').lower() in ('1', 'true', 'yes', 'on')
+
 # Validation function to ensure all required environment variables are set
 def validate_config() -> Dict[str, Any]:
     """Validate that all required configuration variables are set properly."""
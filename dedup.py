@@ -0,0 +1,78 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class DedupEntry:
+    """State kept for one piece of content seen within the dedup window."""
+
+    __slots__ = ('key', 'first_seen', 'count', 'chats', 'message_id', 'text', 'session', 'edit_pending')
+
+    def __init__(self, key: bytes, chat_id: int):
+        self.key = key
+        self.first_seen = time.monotonic()
+        self.count = 1
+        self.chats = {chat_id}
+        self.message_id = None  # ID of our forward in the target channel, once sent
+        self.text = None  # Text of that forward, needed to edit in the hit count
+        self.session = None  # Name of the session that sent it; only it can edit it
+        self.edit_pending = False
+
+
+class DuplicateFilter:
+    """Recognize content that was already forwarded within a time window.
+
+    Content is identified by a short BLAKE2 digest of its normalized text plus
+    the media ID if there is one. Entries are kept in first-seen order, so
+    both expiry and the ``max_entries`` memory cap evict from the front in
+    O(1).
+    """
+
+    def __init__(self, window: float = 3600.0, max_entries: int = 5000):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, DedupEntry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def fingerprint(normalized_text: str, media_id: Optional[int] = None) -> bytes:
+        """Digest of the content, ignoring differences in whitespace."""
+        digest = hashlib.blake2b(" ".join(normalized_text.split()).encode('utf-8'), digest_size=12)
+        if media_id is not None:
+            digest.update(b'\0' + str(media_id).encode('ascii'))
+        return digest.digest()
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.window
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.first_seen >= cutoff and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def check(self, key: bytes, chat_id: int):
+        """Record a sighting of ``key``.
+
+        Returns ``(entry, is_duplicate)``. For a duplicate the entry's hit
+        count has already been increased.
+        """
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.count += 1
+            entry.chats.add(chat_id)
+            return entry, True
+
+        entry = DedupEntry(key, chat_id)
+        self._entries[key] = entry
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry, False
+
+    def forget(self, entry: DedupEntry):
+        """Drop ``entry`` after its first forward failed, so the next copy is forwarded."""
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Iterator, Optional
+
+from telethon import utils
+from telethon.tl.types import (
+    Channel,
+    Chat,
+    InputPeerChannel,
+    InputPeerChat,
+    PeerChannel,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DialogEntry:
+    """What we need to know about one group or channel we are a member of."""
+
+    __slots__ = ('chat_id', 'type', 'title', 'access_hash', 'writable')
+
+    def __init__(self, chat_id: int, type: str, title: str, access_hash: Optional[int], writable: bool):
+        self.chat_id = chat_id  # Marked peer ID (-100... for channels)
+        self.type = type  # 'group', 'supergroup' or 'channel'
+        self.title = title
+        self.access_hash = access_hash
+        self.writable = writable
+
+    @classmethod
+    def from_entity(cls, entity) -> Optional['DialogEntry']:
+        """Build an entry from a Telethon Chat/Channel, or None for other entities."""
+        if isinstance(entity, Channel):
+            if entity.left:
+                return None
+            if entity.megagroup or getattr(entity, 'gigagroup', False):
+                chat_type = 'supergroup'
+                banned = entity.banned_rights or entity.default_banned_rights
+                writable = entity.creator or entity.admin_rights is not None or not (banned and banned.send_messages)
+            else:
+                chat_type = 'channel'
+                writable = entity.creator or bool(entity.admin_rights and entity.admin_rights.post_messages)
+            return cls(utils.get_peer_id(entity), chat_type, entity.title, entity.access_hash, writable)
+
+        if isinstance(entity, Chat):
+            if entity.left or entity.deactivated:
+                return None
+            banned = entity.default_banned_rights
+            writable = entity.creator or entity.admin_rights is not None or not (banned and banned.send_messages)
+            return cls(utils.get_peer_id(entity), 'group', entity.title, None, writable)
+
+        return None
+
+    def input_peer(self):
+        """InputPeer for API calls, built without a network round trip."""
+        bare_id, peer_type = utils.resolve_id(self.chat_id)
+        if peer_type is PeerChannel:
+            return InputPeerChannel(bare_id, self.access_hash or 0)
+        return InputPeerChat(bare_id)
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'DialogEntry':
+        return cls(**{slot: data.get(slot) for slot in cls.__slots__})
+
+
+class DialogIndex:
+    """In-memory index of the groups and channels the account is in.
+
+    It is built from ``iter_dialogs``, persisted to disk and afterwards kept
+    current from membership updates, so broadcasts and chat lookups no
+    longer need to page through GetDialogs. A saved index is reconciled with
+    ``iter_dialogs`` once per start, in the background.
+
+    Changes are saved ``save_delay`` seconds after the first one, in a worker
+    thread, so a burst of membership updates costs one write off the event
+    loop instead of one write per update.
+    """
+
+    def __init__(self, path: str, save_delay: float = 1.0):
+        self.path = path
+        self.save_delay = save_delay
+        self._entries: Dict[int, DialogEntry] = {}
+        self._dirty = False
+        self._save_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self._entries
+
+    def __iter__(self) -> Iterator[DialogEntry]:
+        return iter(self._entries.values())
+
+    def get(self, chat_id: int) -> Optional[DialogEntry]:
+        return self._entries.get(chat_id)
+
+    def writable(self) -> Iterator[DialogEntry]:
+        """Entries we are allowed to post in."""
+        return (entry for entry in self._entries.values() if entry.writable)
+
+    def load(self) -> bool:
+        """Load the index from disk. Returns False if there is nothing usable."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = [DialogEntry.from_dict(data) for data in json.load(f)]
+        except Exception as e:
+            logger.error(f"Could not load dialog index: {str(e)}")
+            return False
+        self._entries = {entry.chat_id: entry for entry in entries}
+        return True
+
+    def _snapshot(self) -> list:
+        return [entry.to_dict() for entry in self._entries.values()]
+
+    def _write(self, data: list):
+        """Write ``data`` to disk atomically."""
+        tmp_file = self.path + '.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.path)
+        except Exception as e:
+            logger.error(f"Could not save dialog index: {str(e)}")
+
+    def save(self):
+        """Schedule a save; changes made within ``save_delay`` are written together."""
+        self._dirty = True
+        if self._save_task is not None and not self._save_task.done():
+            return
+        try:
+            self._save_task = asyncio.get_running_loop().create_task(self._save_later())
+        except RuntimeError:
+            # No event loop (e.g. in a script): write right away
+            self._dirty = False
+            self._write(self._snapshot())
+
+    async def _save_later(self):
+        # One task writes at a time; changes made while it writes go in its next round
+        while self._dirty:
+            await asyncio.sleep(self.save_delay)
+            self._dirty = False
+            await asyncio.to_thread(self._write, self._snapshot())
+
+    async def flush(self):
+        """Wait until pending changes are on disk (used on shutdown)."""
+        if self._save_task is not None:
+            await asyncio.gather(self._save_task, return_exceptions=True)
+
+    def replace_all(self, entities):
+        """Rebuild the whole index from a list of entities and persist it."""
+        entries = (DialogEntry.from_entity(entity) for entity in entities)
+        self._entries = {entry.chat_id: entry for entry in entries if entry is not None}
+        self.save()
+
+    def update_entity(self, entity) -> bool:
+        """Add, refresh or drop one chat after a membership change. Returns True if changed."""
+        if getattr(entity, 'min', False):
+            # "min" entities from updates lack a usable access hash
+            return False
+        chat_id = utils.get_peer_id(entity)
+        entry = DialogEntry.from_entity(entity)
+        if entry is None:
+            return self.remove(chat_id)
+
+        old = self._entries.get(chat_id)
+        if old is not None and old.to_dict() == entry.to_dict():
+            return False
+        self._entries[chat_id] = entry
+        self.save()
+        return True
+
+    def remove(self, chat_id: int) -> bool:
+        """Drop a chat we left or were removed from. Returns True if it was indexed."""
+        if self._entries.pop(chat_id, None) is None:
+            return False
+        self.save()
+        return True
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+from telethon.errors import FloodWaitError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Telegram's limit for the text of a single message
+MAX_MESSAGE_LENGTH = 4096
+
+
+class DigestBuffer:
+    """Coalesce matches into a single message per time window.
+
+    Entries are buffered until ``window`` seconds have passed since the first
+    one or until adding another entry would exceed Telegram's message length
+    limit, whichever comes first. Each flush is sent as one message.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        window: float = 10.0,
+        header: str = "",
+        max_length: int = MAX_MESSAGE_LENGTH,
+        max_retries: int = 3,
+    ):
+        self._send = send
+        self.window = window
+        self.header = header
+        self.max_length = max_length
+        self.max_retries = max_retries
+        self._entries: List[str] = []
+        self._length = len(header)
+        self._timer: Optional[asyncio.Task] = None
+        self._running_flushes = set()
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def add(self, entry: str):
+        """Buffer one entry, flushing first if it would not fit."""
+        # An entry that can never fit on its own is cut down to size
+        room = self.max_length - len(self.header) - 2
+        if len(entry) > room:
+            entry = entry[:room - 1] + "…"
+
+        if self._entries and self._length + len(entry) + 2 > self.max_length:
+            await self.flush()
+
+        self._entries.append(entry)
+        self._length += len(entry) + 2
+        if self._timer is None or self._timer.done():
+            # Kept referenced until done, so close() can wait for a digest in flight
+            self._timer = asyncio.create_task(self._flush_later())
+            self._running_flushes.add(self._timer)
+            self._timer.add_done_callback(self._running_flushes.discard)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        """Send everything buffered so far as one message."""
+        async with self._lock:
+            if not self._entries:
+                return
+            entries, self._entries = self._entries, []
+            self._length = len(self.header)
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+                self._timer = None
+
+            text = self.header + "\n\n".join(entries)
+            for attempt in range(1, self.max_retries + 1):
+                try:
+                    await self._send(text)
+                    metrics.FORWARDS_SENT.inc(len(entries))
+                    logger.info(f"Sent digest with {len(entries)} matches")
+                    return
+                except FloodWaitError as e:
+                    metrics.FLOOD_WAITS.inc()
+                    logger.warning(f"FloodWait while sending digest, waiting {e.seconds}s")
+                    await asyncio.sleep(e.seconds)
+                except Exception as e:
+                    logger.error(f"Error sending digest (attempt {attempt}): {str(e)}")
+                    await asyncio.sleep(attempt)
+            metrics.FORWARDS_FAILED.inc(len(entries))
+            logger.error(f"Dropped a digest of {len(entries)} matches after {self.max_retries} attempts")
+
+    async def close(self):
+        """Flush pending entries, wait for a digest in flight and stop the window timer."""
+        # self._timer is only set while the timer still waits out its window
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        self._timer = None
+        await asyncio.gather(*self._running_flushes, return_exceptions=True)
+        await self.flush()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from telethon.errors import FloodWaitError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ForwardJob:
+    """A matched message waiting to be delivered to the target channel."""
+
+    __slots__ = ('event', 'message_text', 'keywords', 'queued_at', 'attempts', 'dedup', 'copy')
+
+    def __init__(self, event, message_text: str, keywords: List[str], dedup=None):
+        self.event = event
+        self.message_text = message_text
+        self.keywords = keywords
+        self.queued_at = time.monotonic()
+        self.attempts = 0
+        self.dedup = dedup  # DedupEntry for this content, if dedup is enabled
+        self.copy = False  # Send as a copy with a link even in native forward mode
+
+
+class Forwarder:
+    """Deliver matches from a bounded queue with a pool of worker tasks.
+
+    The Telethon event handler only enqueues jobs, so a slow send or a
+    FloodWait no longer stalls the ingestion of other updates. When the queue
+    is full ``submit`` waits for a free slot (backpressure). A FloodWaitError
+    pauses every worker until the wait is over; other errors are retried with
+    exponential backoff and jitter. ``on_failed(job)`` is called for a job
+    that is given up on.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[ForwardJob], Awaitable[None]],
+        workers: int = 2,
+        queue_size: int = 1000,
+        max_retries: int = 3,
+        retry_delay: float = 1.0,
+        on_failed: Optional[Callable[[ForwardJob], None]] = None,
+    ):
+        self._deliver = deliver
+        self._on_failed = on_failed
+        self.worker_count = max(1, workers)
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._resume_at = 0.0
+
+    def start(self):
+        """Create the queue and spawn the worker tasks."""
+        if self._workers:
+            return
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"forwarder-{i}")
+            for i in range(self.worker_count)
+        ]
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting in the queue."""
+        return self.queue.qsize() if self.queue else 0
+
+    async def submit(self, job: ForwardJob):
+        """Queue a job, waiting for a free slot if the queue is full."""
+        if self.queue is None:
+            raise RuntimeError("Forwarder has not been started")
+        await self.queue.put(job)
+
+    async def deliver_now(self, job: ForwardJob):
+        """Deliver a job in the caller's task, with the usual retries, bypassing the queue."""
+        await self._process(job)
+
+    def pause_for(self, seconds: float):
+        """Hold back every worker for ``seconds`` (e.g. after a FloodWait)."""
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def _wait_if_paused(self):
+        delay = self._resume_at - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._resume_at - time.monotonic()
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._process(job)
+            except Exception:
+                logger.exception("Unexpected error while forwarding a match")
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, job: ForwardJob):
+        while True:
+            await self._wait_if_paused()
+            job.attempts += 1
+            try:
+                await self._deliver(job)
+                return
+            except FloodWaitError as e:
+                # Flood waits are not the job's fault, so they don't use up a retry
+                job.attempts -= 1
+                metrics.FLOOD_WAITS.inc()
+                logger.warning(f"FloodWait while forwarding, pausing workers for {e.seconds}s")
+                self.pause_for(e.seconds)
+            except Exception as e:
+                if job.attempts > self.max_retries:
+                    metrics.FORWARDS_FAILED.inc()
+                    logger.error(f"Giving up on forwarding after {job.attempts} attempts: {str(e)}")
+                    if self._on_failed is not None:
+                        self._on_failed(job)
+                    return
+                delay = self.retry_delay * (2 ** (job.attempts - 1))
+                delay += random.uniform(0, self.retry_delay)
+                logger.warning(f"Forwarding failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def drain(self, timeout: float = 10.0):
+        """Deliver what is still queued (up to ``timeout`` seconds), then stop the workers."""
+        if self.queue is not None and self._workers:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Forward queue not drained in {timeout}s, {self.depth} jobs dropped")
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
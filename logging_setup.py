@@ -0,0 +1,95 @@
+import json
+import logging
+import logging.handlers
+import queue
+from typing import Dict
+
+import config
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formatter that appends fields passed via ``extra=`` to the message.
+
+    With ``as_json`` every record becomes one JSON object per line, which is
+    what the match/forward records are meant for; otherwise the fields are
+    appended as ``key=value`` pairs.
+    """
+
+    def __init__(self, fmt: str, as_json: bool = False):
+        super().__init__(fmt)
+        self.as_json = as_json
+
+    @staticmethod
+    def _fields(record: logging.LogRecord) -> Dict[str, object]:
+        return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRS}
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = self._fields(record)
+        if self.as_json:
+            data = {
+                'time': self.formatTime(record),
+                'logger': record.name,
+                'level': record.levelname,
+                'message': record.getMessage(),
+            }
+            data.update(fields)
+            if record.exc_info:
+                data['exc_info'] = self.formatException(record.exc_info)
+            return json.dumps(data, ensure_ascii=False, default=str)
+
+        text = super().format(record)
+        if fields:
+            text += " | " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+def _file_handler() -> logging.Handler:
+    if config.LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(
+            config.LOG_FILE,
+            when=config.LOG_ROTATE_WHEN,
+            backupCount=config.LOG_BACKUP_COUNT,
+            encoding='utf-8',
+        )
+    return logging.handlers.RotatingFileHandler(
+        config.LOG_FILE,
+        maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT,
+        encoding='utf-8',
+    )
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """Route all logging through a queue to a background writer thread.
+
+    Log calls on the event loop only put the record on a queue; formatting
+    and disk/console writes happen in the QueueListener's thread. The caller
+    must stop the returned listener on exit to flush pending records.
+    """
+    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+    file_handler = _file_handler()
+    file_handler.setFormatter(StructuredFormatter(log_format, as_json=config.LOG_JSON))
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(StructuredFormatter(log_format))
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(config.LOG_LEVEL)
+
+    for name, level in config.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+
+    listener.start()
+    return listener
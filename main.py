@@ -1,41 +1,40 @@
 import asyncio
 import logging
+import signal
 import sys
 import os
 from typing import Dict, Any
 
-# Configure logging - make it more verbose for debugging
-logging.basicConfig(
-    level=logging.DEBUG,  # Changed from INFO to DEBUG
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("telegram_bot.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-# Configure python-telegram-bot and httpx libraries for more verbose logging
-logging.getLogger('telegram').setLevel(logging.DEBUG)
-logging.getLogger('httpx').setLevel(logging.DEBUG)
-
 # Import our modules
 import config
+import metrics
+from logging_setup import setup_logging
+
+# Configure logging: records are written to the rotating log file by a
+# background thread; levels per subsystem come from config.LOG_LEVELS
+log_listener = setup_logging()
+logger = logging.getLogger(__name__)
+
 from userbot import UserBot
 from bot import TelegramBot
+from reloader import HotReloader
 
-async def setup_and_run():
-    """Set up and run both clients."""
-    # Print config values for debugging
-    print("=== Configuration ===")
-    print(f"API_ID: {config.API_ID}")
-    print(f"API_HASH: {'Set' if config.API_HASH else 'Not set'}")
-    print(f"BOT_TOKEN: {'Set' if config.BOT_TOKEN else 'Not set'}")
-    print(f"TARGET_CHANNEL: {config.TARGET_CHANNEL}")
-    print(f"OWNER_ID: {config.OWNER_ID}")
-    print(f"ADMIN_IDS: {config.ADMIN_IDS}")
-    print(f"KEYWORDS: {config.KEYWORDS}")
-    print("====================")
+async def setup_and_run(client_factory=None, application_builder=None):
+    """Set up and run both clients.
+    
+    The optional factories are passed on to UserBot and TelegramBot; they
+    are used to run against stand-in clients (see benchmarks/load_harness.py).
+    """
+    # Log config values for debugging
+    logger.info("=== Configuration ===")
+    logger.info(f"API_ID: {config.API_ID}")
+    logger.info(f"API_HASH: {'Set' if config.API_HASH else 'Not set'}")
+    logger.info(f"BOT_TOKEN: {'Set' if config.BOT_TOKEN else 'Not set'}")
+    logger.info(f"TARGET_CHANNEL: {config.TARGET_CHANNEL}")
+    logger.info(f"OWNER_ID: {config.OWNER_ID}")
+    logger.info(f"ADMIN_IDS: {config.ADMIN_IDS}")
+    logger.info(f"KEYWORDS: {len(config.KEYWORDS)} keywords")
+    logger.info("====================")
     
     # Validate configuration first
     config_issues = config.validate_config()
@@ -45,63 +44,57 @@ async def setup_and_run():
         logger.error("Please check your .env file and fix the above issues.")
         return  # Changed from sys.exit(1) to allow for more graceful termination
     
+    # Stop on SIGINT/SIGTERM (not available on Windows, where Ctrl+C raises
+    # KeyboardInterrupt and asyncio.run cancels this coroutine instead)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    
+    # Create UserBot instance
+    userbot = UserBot(client_factory)
+    
+    # Create Bot instance with reference to UserBot
+    bot = TelegramBot(userbot, application_builder)
+    
+    # Set bot client reference in userbot
+    userbot.set_bot_client(bot)
+    
     try:
-        # Create UserBot instance
-        userbot = UserBot()
+        # Metrics: event loop lag sampling and the localhost Prometheus endpoint
+        lag_monitor = asyncio.create_task(metrics.monitor_loop_lag())
+        if config.METRICS_PORT:
+            metrics_server = metrics.MetricsServer(config.METRICS_HOST, config.METRICS_PORT)
+            try:
+                await metrics_server.start()
+            except OSError as e:
+                logger.error(f"Could not start metrics server: {str(e)}")
         
-        # Create Bot instance with reference to UserBot
-        bot = TelegramBot(userbot)
+        # Start both clients at the same time; if one fails the other is cancelled
+        logger.info("Starting UserBot and Bot clients...")
+        await run_supervised(userbot.start(), bot.start())
         
-        # Set bot client reference in userbot
-        userbot.set_bot_client(bot)
+        # Show information about how to use the bot
+        logger.info("=========== HOW TO USE ============")
+        logger.info(f"Bot username: @{bot.application.bot.username}")
+        logger.info("Send /start to the bot to begin using it.")
+        logger.info("==================================")
         
-        # Start both clients
-        logger.info("Starting UserBot client...")
-        await userbot.start()
+        # Receive updates through the webhook or long polling (config.BOT_UPDATE_MODE)
+        await bot.start_updates()
         
-        logger.info("Starting Bot client...")
-        try:
-            # Initialize the bot application
-            application = await bot.start()
-            
-            # Show information about how to use the bot
-            logger.info("=========== HOW TO USE ============")
-            bot_info = await bot.application.bot.get_me()
-            logger.info(f"Bot username: @{bot_info.username}")
-            logger.info("Send /start to the bot to begin using it.")
-            logger.info("==================================")
-            
-            # Start bot - the correct way in PTB v20+ is to use application.run_polling()
-            # BUT we need to handle it differently since we're already in an async context
-            logger.info("Starting bot polling...")
-            
-            # For v20+, we need to just call start() to initialize the bot's API connection
-            # and then we manually create and run updater in the background
-            await application.initialize()
-            
-            # Actually start the bot to receive updates
-            await application.start()
-            
-            # Create update tasks in a non-blocking way
-            application.create_task(
-                application.updater.start_polling(
-                    poll_interval=1.0,
-                    timeout=30,
-                    drop_pending_updates=True,
-                    allowed_updates=["message", "callback_query", "inline_query", "chat_member"]
-                )
-            )
-            
-            logger.info("Both clients are now running!")
-            
-            # Keep the application alive
-            while True:
-                await asyncio.sleep(10)
-                
-        except Exception as bot_error:
-            logger.error(f"Failed to start bot: {str(bot_error)}")
-            logger.error("This might be due to an invalid BOT_TOKEN or network issues.")
-            raise bot_error
+        # Pick up keyword/admin changes from other instances and ops scripts
+        if config.HOT_RELOAD_INTERVAL > 0:
+            reloader = asyncio.create_task(HotReloader(userbot, bot, config.HOT_RELOAD_INTERVAL).run())
+        
+        logger.info("Both clients are now running!")
+        
+        # Run until a stop signal arrives
+        await stop_event.wait()
+        logger.info("Received stop signal, shutting down...")
             
     except KeyboardInterrupt:
         logger.info("Received stop signal, shutting down...")
@@ -109,25 +102,54 @@ async def setup_and_run():
         logger.error(f"Error: {str(e)}")
         logger.exception("Detailed error information:")
     finally:
+        # Stop the background tasks first, so the reloader can't touch the
+        # clients or the store while they shut down
+        background = [task for task in (locals().get('reloader'), locals().get('lag_monitor')) if task]
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        
         # Stop both clients
         logger.info("Stopping clients...")
         
-        # Stop UserBot
-        try:
-            if 'userbot' in locals() and userbot.running:
-                await userbot.stop()
-        except Exception as e:
-            logger.error(f"Error stopping UserBot: {str(e)}")
+        stops = []
+        if userbot.running:
+            stops.append(userbot.stop())
+        if bot.application:
+            stops.append(bot.stop())
+        for result in await asyncio.gather(*stops, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error(f"Error stopping client: {str(result)}")
         
-        # Stop official Bot
-        try:
-            if 'bot' in locals() and hasattr(bot, 'application') and bot.application:
-                await bot.stop()
-        except Exception as e:
-            logger.error(f"Error stopping Bot: {str(e)}")
+        # Stop the metrics endpoint
+        if 'metrics_server' in locals():
+            await metrics_server.stop()
+        
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
         
         logger.info("Both clients have been stopped.")
 
+async def run_supervised(*coroutines):
+    """Run coroutines concurrently; the first failure cancels the others and is raised."""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        if task.exception() is not None:
+            raise task.exception()
+
 def main():
     """Main entry point."""
     try:
@@ -135,16 +157,19 @@ def main():
         if sys.platform == 'win32':
             asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
         
-        # Print Python version for debugging
-        print(f"Python version: {sys.version}")
+        # Log Python version for debugging
+        logger.info(f"Python version: {sys.version}")
         
         # Run the bot
         asyncio.run(setup_and_run())
     except KeyboardInterrupt:
-        print("Bot stopped by user!")
+        logger.info("Bot stopped by user!")
     except Exception as e:
-        print(f"Error: {str(e)}")
-        logger.exception("Unhandled exception:")
+        logger.exception(f"Unhandled exception: {str(e)}")
+    finally:
+        # Wait for pending database writes, then flush the logging queue
+        config.STORE.close()
+        log_listener.stop()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,115 @@
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from normalizer import normalize_text, offset_map
+
+
+class KeywordHit(NamedTuple):
+    """A single keyword occurrence inside a message."""
+    keyword: str
+    start: int
+    end: int
+
+
+def _build_trie(words: Iterable[str]) -> Dict[str, dict]:
+    """Build a character trie; the empty-string key marks the end of a word."""
+    root: Dict[str, dict] = {}
+    for word in words:
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return root
+
+
+def _trie_to_pattern(node: Dict[str, dict]) -> str:
+    """Turn a trie into a regex that shares common prefixes between keywords."""
+    alternatives = []
+    single_chars = []
+    for char in sorted(key for key in node if key):
+        sub_pattern = _trie_to_pattern(node[char])
+        if sub_pattern:
+            alternatives.append(re.escape(char) + sub_pattern)
+        else:
+            single_chars.append(char)
+
+    if single_chars:
+        if len(single_chars) == 1:
+            alternatives.append(re.escape(single_chars[0]))
+        else:
+            alternatives.append("[" + "".join(re.escape(c) for c in single_chars) + "]")
+
+    if not alternatives:
+        return ""
+
+    is_word_end = '' in node
+    if len(alternatives) == 1 and not is_word_end:
+        return alternatives[0]
+
+    pattern = "(?:" + "|".join(alternatives) + ")"
+    if is_word_end:
+        pattern += "?"
+    return pattern
+
+
+class KeywordMatcher:
+    """Match a whole keyword list against a message in a single regex pass.
+
+    The keywords are folded into a prefix trie and compiled once into one
+    pattern, so the per-message cost no longer grows with one ``re.search``
+    per keyword. Keywords are stored in their canonical form (see
+    ``normalizer.normalize_text``) and each message is normalized once before
+    the scan, so one keyword matches all of its spelling variants.
+
+    Instances are immutable: to change the keyword list build a new matcher
+    and swap the reference.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self._lookup: Dict[str, str] = {}
+        for keyword in keywords:
+            keyword = keyword.strip()
+            canonical = normalize_text(keyword)
+            if canonical and canonical not in self._lookup:
+                self._lookup[canonical] = keyword
+
+        self.keywords = tuple(self._lookup.values())
+        self._pattern: Optional[re.Pattern] = None
+        if self._lookup:
+            trie_pattern = _trie_to_pattern(_build_trie(self._lookup))
+            self._pattern = re.compile(rf"\b{trie_pattern}\b")
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """Return every keyword occurrence in ``text`` with its offsets.
+
+        Occurrences are non-overlapping; where keywords share a prefix the
+        longest one that ends on a word boundary wins. Offsets refer to the
+        original, un-normalized text.
+        """
+        if self._pattern is None or not text:
+            return []
+        return self.find_all_normalized(text, normalize_text(text))
+
+    def find_all_normalized(self, text: str, normalized: str) -> List[KeywordHit]:
+        """Like ``find_all`` for callers that already normalized ``text``."""
+        if self._pattern is None or not normalized:
+            return []
+
+        hits = []
+        positions = None
+        for match in self._pattern.finditer(normalized):
+            start, end = match.start(), match.end()
+            if len(normalized) != len(text):
+                if positions is None:
+                    positions = offset_map(text)
+                start, end = positions[start], positions[end - 1] + 1
+            hits.append(KeywordHit(self._lookup[match.group(0)], start, end))
+        return hits
+
+    def search(self, text: str) -> Optional[KeywordHit]:
+        """Return the first keyword occurrence in ``text``, if any."""
+        hits = self.find_all(text)
+        return hits[0] if hits else None
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from telethon import utils
+from telethon.tl.functions.users import GetUsersRequest
+from telethon.tl.types import Channel, Chat, User
+
+logger = logging.getLogger(__name__)
+
+
+class SenderInfo:
+    """The parts of a sender that end up in a forwarded match."""
+
+    __slots__ = ('user_id', 'name', 'username')
+
+    def __init__(self, user_id: int, name: str, username: Optional[str]):
+        self.user_id = user_id
+        self.name = name
+        self.username = username
+
+    @classmethod
+    def from_entity(cls, entity) -> Optional['SenderInfo']:
+        if isinstance(entity, User):
+            name = f"{entity.first_name or ''} {entity.last_name or ''}".strip()
+            return cls(entity.id, name, entity.username)
+        if isinstance(entity, Channel):
+            # Channel posts and anonymous group admins
+            return cls(utils.get_peer_id(entity), entity.title, entity.username)
+        return None
+
+
+class ChatInfo:
+    """The parts of a chat that end up in a forwarded match."""
+
+    __slots__ = ('chat_id', 'title', 'username')
+
+    def __init__(self, chat_id: int, title: str, username: Optional[str]):
+        self.chat_id = chat_id
+        self.title = title
+        self.username = username
+
+    @classmethod
+    def from_entity(cls, entity) -> Optional['ChatInfo']:
+        if isinstance(entity, (Channel, Chat)):
+            return cls(utils.get_peer_id(entity), entity.title, getattr(entity, 'username', None))
+        return None
+
+
+class _LRU(OrderedDict):
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+
+    def get_recent(self, key):
+        value = self.get(key)
+        if value is not None:
+            self.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+
+class MetadataCache:
+    """Bounded caches of sender and chat metadata used to enrich matches.
+
+    The caches are fed from entities that already arrived with updates.
+    Senders that are still unknown are looked up with a batched
+    ``GetUsersRequest``: lookups made within ``batch_delay`` seconds of each
+    other share one request, so enrichment never costs a round trip per match.
+    """
+
+    def __init__(
+        self,
+        call: Callable[[object], Awaitable[object]],
+        max_size: int = 10000,
+        batch_delay: float = 0.05,
+        batch_size: int = 100,
+    ):
+        self._call = call
+        self.senders = _LRU(max_size)
+        self.chats = _LRU(max_size)
+        self.batch_delay = batch_delay
+        self.batch_size = batch_size
+        self._pending: Dict[int, tuple] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._running_flushes = set()
+
+    def remember(self, entity):
+        """Cache metadata from an entity that came with an update (may be None)."""
+        if entity is None:
+            return
+        sender = SenderInfo.from_entity(entity)
+        if sender is not None:
+            self.senders.put(sender.user_id, sender)
+        chat = ChatInfo.from_entity(entity)
+        if chat is not None:
+            self.chats.put(chat.chat_id, chat)
+
+    def get_chat(self, chat_id: int) -> Optional[ChatInfo]:
+        return self.chats.get_recent(chat_id)
+
+    async def get_sender(self, user_id: int, input_user=None) -> Optional[SenderInfo]:
+        """Cached sender info, fetched in a batch if missing and ``input_user`` is given."""
+        info = self.senders.get_recent(user_id)
+        if info is not None or input_user is None:
+            return info
+
+        pending = self._pending.get(user_id)
+        if pending is None:
+            pending = (input_user, asyncio.get_running_loop().create_future())
+            self._pending[user_id] = pending
+            if len(self._pending) >= self.batch_size:
+                self._start_flush(0)
+            elif self._flush_task is None:
+                self._start_flush(self.batch_delay)
+        return await asyncio.shield(pending[1])
+
+    def _start_flush(self, delay: float):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        self._flush_task = asyncio.create_task(self._flush(delay))
+        self._running_flushes.add(self._flush_task)
+        self._flush_task.add_done_callback(self._running_flushes.discard)
+
+    async def _flush(self, delay: float):
+        await asyncio.sleep(delay)
+        batch, self._pending = self._pending, {}
+        self._flush_task = None
+        if not batch:
+            return
+
+        found = {}
+        input_users = [input_user for input_user, _ in batch.values()]
+        try:
+            for start in range(0, len(input_users), self.batch_size):
+                chunk = input_users[start:start + self.batch_size]
+                try:
+                    for user in await self._call(GetUsersRequest(chunk)):
+                        self.remember(user)
+                        info = SenderInfo.from_entity(user)
+                        if info is not None:
+                            found[info.user_id] = info
+                except Exception as e:
+                    logger.warning(f"Batched lookup of {len(chunk)} senders failed: {str(e)}")
+        finally:
+            # The batch is no longer in _pending, so its waiters must be woken
+            # here even if the flush is cancelled mid-lookup
+            for user_id, (_, future) in batch.items():
+                if not future.done():
+                    future.set_result(found.get(user_id))
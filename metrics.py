@@ -0,0 +1,213 @@
+import asyncio
+import bisect
+import logging
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class Counter:
+    """A monotonically increasing value."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, self.value
+
+
+class Gauge:
+    """A value that goes up and down; optionally read from a callback."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from ``function`` whenever metrics are collected."""
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            try:
+                return self._function()
+            except Exception:
+                return float('nan')
+        return self.value
+
+    def samples(self):
+        yield self.name, self.get()
+
+
+class Histogram:
+    """Cumulative bucket histogram, as in the Prometheus exposition format."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls into."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound:g}"}}', cumulative
+        yield f'{self.name}_bucket{{le="+Inf"}}', self.count
+        yield f'{self.name}_sum', self.sum
+        yield f'{self.name}_count', self.count
+
+
+class Registry:
+    """Holds all metrics of the process and renders them."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._register(Gauge(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float]) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, value in metric.samples():
+                lines.append(f"{sample_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+MESSAGES_SEEN = REGISTRY.counter('userbot_messages_seen_total', 'Messages received by keyword_monitor')
+MESSAGES_MATCHED = REGISTRY.counter('userbot_messages_matched_total', 'Messages that matched at least one keyword')
+FORWARDS_SENT = REGISTRY.counter('userbot_forwards_sent_total', 'Matches delivered to the target channel')
+FORWARDS_FAILED = REGISTRY.counter('userbot_forwards_failed_total', 'Matches dropped after all retries')
+FLOOD_WAITS = REGISTRY.counter('userbot_flood_waits_total', 'FloodWait errors received')
+SCAN_MESSAGES = REGISTRY.counter('userbot_scan_messages_total', 'Past messages read by history scans')
+MATCH_SECONDS = REGISTRY.histogram(
+    'userbot_match_seconds', 'Time spent normalizing and matching one message',
+    (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+)
+FORWARD_LATENCY_SECONDS = REGISTRY.histogram(
+    'userbot_forward_latency_seconds', 'Time from a match being queued to it being sent',
+    (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+QUEUE_DEPTH = REGISTRY.gauge('userbot_forward_queue_depth', 'Matches waiting in the forwarding queue')
+LOOP_LAG = REGISTRY.gauge('process_event_loop_lag_seconds', 'How late the event loop ran a scheduled wakeup')
+
+
+def summary_text() -> str:
+    """Short human readable summary for the /metrics bot command."""
+    return (
+        "📊 Metrics\n\n"
+        f"Messages seen: {MESSAGES_SEEN.value}\n"
+        f"Messages matched: {MESSAGES_MATCHED.value}\n"
+        f"Forwards sent: {FORWARDS_SENT.value}\n"
+        f"Forwards failed: {FORWARDS_FAILED.value}\n"
+        f"FloodWaits: {FLOOD_WAITS.value}\n\n"
+        f"Match time p50/p99: {MATCH_SECONDS.quantile(0.5) * 1e6:g} / {MATCH_SECONDS.quantile(0.99) * 1e6:g} µs\n"
+        f"Forward latency p50/p99: {FORWARD_LATENCY_SECONDS.quantile(0.5):g} / "
+        f"{FORWARD_LATENCY_SECONDS.quantile(0.99):g} s\n\n"
+        f"Queue depth: {QUEUE_DEPTH.get():g}\n"
+        f"Event loop lag: {LOOP_LAG.get() * 1000:.1f} ms"
+    )
+
+
+async def monitor_loop_lag(interval: float = 1.0):
+    """Measure how late ``asyncio.sleep`` wakes up; runs until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.set(max(0.0, loop.time() - started - interval))
+
+
+class MetricsServer:
+    """Minimal HTTP server exposing ``GET /metrics`` in Prometheus format."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9464, registry: Registry = REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"📊 Metrics available at http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Skip the request headers
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+                pass
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, content_type = '200 OK', 'text/plain; version=0.0.4; charset=utf-8'
+                body = self.registry.render_prometheus().encode('utf-8')
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', b'Not Found\n'
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
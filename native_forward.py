@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from telethon.errors import ChatForwardsRestrictedError, FloodWaitError, MessageIdInvalidError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# The most messages one ForwardMessages request accepts
+MAX_BATCH = 100
+
+
+class ForwardItem:
+    """One matched message waiting to be forwarded natively."""
+
+    __slots__ = ('event', 'message_id', 'note', 'queued_at', 'dedup', 'job')
+
+    def __init__(self, event, note: Optional[str], queued_at: Optional[float] = None, dedup=None, job=None):
+        self.event = event
+        self.message_id = event.message.id
+        self.note = note  # Compact description for the reply, or None
+        self.queued_at = queued_at or time.monotonic()
+        self.dedup = dedup  # DedupEntry for this content, if dedup is enabled
+        self.job = job  # The ForwardJob it came from, for the copy fallback
+
+
+class ForwardBatcher:
+    """Collect matched messages per source chat and forward each chat's batch at once.
+
+    A chat's batch is sent ``window`` seconds after its first message or as
+    soon as it holds ``max_batch`` messages, so a burst of matches in one
+    group costs a single forward request instead of one send per match.
+    ``on_dropped(chat_id, items)`` is called for a batch that is given up on.
+
+    Messages that cannot be forwarded at all (the chat protects its content,
+    or a message is gone) are not retried but handed to
+    ``fallback(chat_id, items)``. Protected chats are remembered in
+    ``restricted`` so their later matches can skip native forwarding.
+    """
+
+    def __init__(
+        self,
+        forward: Callable[[int, List[ForwardItem]], Awaitable[None]],
+        window: float = 2.0,
+        max_batch: int = MAX_BATCH,
+        max_retries: int = 3,
+        on_dropped: Optional[Callable[[int, List[ForwardItem]], None]] = None,
+        fallback: Optional[Callable[[int, List[ForwardItem]], Awaitable[None]]] = None,
+    ):
+        self._forward = forward
+        self._on_dropped = on_dropped
+        self._fallback = fallback
+        self.window = window
+        self.max_batch = max(1, min(max_batch, MAX_BATCH))
+        self.max_retries = max_retries
+        self._batches: Dict[int, List[ForwardItem]] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+        self._running_flushes = set()
+        self.restricted = set()
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._batches.values())
+
+    async def add(self, chat_id: int, item: ForwardItem):
+        """Queue one message, sending the chat's batch right away if it is full."""
+        items = self._batches.setdefault(chat_id, [])
+        items.append(item)
+        if len(items) >= self.max_batch:
+            await self.flush(chat_id)
+        elif chat_id not in self._timers:
+            # Kept referenced until done, so close() can wait for a batch in flight
+            timer = self._timers[chat_id] = asyncio.create_task(self._flush_later(chat_id))
+            self._running_flushes.add(timer)
+            timer.add_done_callback(self._running_flushes.discard)
+
+    async def _flush_later(self, chat_id: int):
+        await asyncio.sleep(self.window)
+        self._timers.pop(chat_id, None)
+        await self.flush(chat_id)
+
+    async def flush(self, chat_id: int):
+        """Forward everything queued for ``chat_id`` in one request."""
+        items = self._batches.pop(chat_id, None)
+        timer = self._timers.pop(chat_id, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        if not items:
+            return
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await self._forward(chat_id, items)
+                now = time.monotonic()
+                metrics.FORWARDS_SENT.inc(len(items))
+                for item in items:
+                    metrics.FORWARD_LATENCY_SECONDS.observe(now - item.queued_at)
+                return
+            except (ChatForwardsRestrictedError, MessageIdInvalidError) as e:
+                # Retrying can't help; the matches are delivered as copies instead
+                if isinstance(e, ChatForwardsRestrictedError):
+                    self.restricted.add(chat_id)
+                logger.warning(f"Cannot forward {len(items)} messages from {chat_id} ({str(e)}), copying them")
+                if self._fallback is not None:
+                    await self._fallback(chat_id, items)
+                return
+            except FloodWaitError as e:
+                metrics.FLOOD_WAITS.inc()
+                logger.warning(f"FloodWait while forwarding from {chat_id}, waiting {e.seconds}s")
+                await asyncio.sleep(e.seconds)
+            except Exception as e:
+                logger.error(f"Error forwarding {len(items)} messages from {chat_id} (attempt {attempt}): {str(e)}")
+                await asyncio.sleep(attempt)
+        metrics.FORWARDS_FAILED.inc(len(items))
+        logger.error(f"Dropped {len(items)} matches from {chat_id} after {self.max_retries} attempts")
+        if self._on_dropped is not None:
+            self._on_dropped(chat_id, items)
+
+    async def close(self):
+        """Send every pending batch, wait for those in flight and stop the window timers."""
+        # Only timers still waiting out their window are in _timers
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        await asyncio.gather(
+            *(self.flush(chat_id) for chat_id in list(self._batches)),
+            *self._running_flushes,
+            return_exceptions=True
+        )
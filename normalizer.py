@@ -0,0 +1,48 @@
+from typing import Dict, List
+
+# Arabic diacritics (tashkeel), Quranic marks and the superscript alef
+_TASHKEEL = [chr(code) for code in range(0x064B, 0x0660)] + ['ٰ']
+
+# Tatweel (kashida) is purely decorative: "عـــاجل" == "عاجل"
+_TATWEEL = 'ـ'
+
+# Letters that are commonly written interchangeably
+_LETTER_VARIANTS = {
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    'ى': 'ي',
+    'ی': 'ي',  # Persian yeh
+    'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+    'ک': 'ك',  # Persian kaf
+}
+
+ARABIC_TRANSLATION: Dict[int, object] = str.maketrans(_LETTER_VARIANTS)
+ARABIC_TRANSLATION.update({ord(char): None for char in _TASHKEEL + [_TATWEEL]})
+
+
+def normalize_text(text: str) -> str:
+    """Return the canonical form used for keyword matching.
+
+    Alef/hamza variants, alef maqsura, ta marbuta and Persian letter forms are
+    folded together, tashkeel and tatweel are dropped and Latin text is
+    lower-cased. This runs once per message, so it is a single
+    ``str.translate`` plus ``str.lower``.
+    """
+    return text.translate(ARABIC_TRANSLATION).lower()
+
+
+def offset_map(text: str) -> List[int]:
+    """Map each index of ``normalize_text(text)`` back to an index in ``text``.
+
+    The list has one extra trailing entry so that end offsets map as well.
+    Only needed when normalization changed the length of the text.
+    """
+    mapping = []
+    for index, char in enumerate(text):
+        mapping.extend([index] * len(normalize_text(char)))
+    mapping.append(len(text))
+    return mapping
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    __slots__ = ('rate', 'capacity', '_tokens', '_updated_at')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    @property
+    def tokens(self) -> float:
+        """Tokens currently available."""
+        self._refill()
+        return self._tokens
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Take ``tokens`` if they are available right now."""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay_for(self, tokens: float = 1) -> float:
+        """Seconds until ``tokens`` would be available."""
+        self._refill()
+        missing = tokens - self._tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    async def acquire(self, tokens: float = 1):
+        """Wait until ``tokens`` are available and take them."""
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay_for(tokens))
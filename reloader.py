@@ -0,0 +1,92 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class HotReloader:
+    """Picks up keyword and admin changes made outside this process.
+
+    Two sources are polled every ``interval`` seconds:
+
+    - The database: ``PRAGMA data_version`` changes on any commit by another
+      connection (a second instance, the sqlite3 CLI, our own writer thread).
+      Only then are the keyword/admin version counters compared, and the
+      matcher or ACL is rebuilt if one of them moved.
+    - ``keywords.json``: when its mtime changes, the keywords in it that are
+      not stored yet are added. Nothing is removed: the database is the
+      source of truth since the migration, and a stale file (after a
+      checkout or a touch) must not wipe what was added through the bot.
+      ``admins.json`` is not watched; admins are only granted and revoked
+      with /addadmin and /removeadmin.
+
+    Rebuilt matchers and ACLs are swapped in with a single assignment, so
+    messages being handled are never dropped.
+    """
+
+    def __init__(self, userbot, bot, interval: float):
+        self.userbot = userbot
+        self.bot = bot
+        self.interval = interval
+        self._data_version = config.STORE.data_version()
+        self._admins_version = config.STORE.version('admins')
+        self._keywords_mtime = self._mtime(config.KEYWORDS_FILE)
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    async def run(self):
+        """Poll until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Hot reload failed: {str(e)}")
+
+    async def check(self):
+        await self._import_keywords_file()
+
+        data_version = config.STORE.data_version()
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        if await self.userbot.reload_keywords():
+            logger.info("♻️ Keywords reloaded")
+
+        admins_version = config.STORE.version('admins')
+        if admins_version != self._admins_version:
+            self._admins_version = admins_version
+            config.load_admins()
+            self.bot.reload_access()
+            logger.info(f"♻️ Admins reloaded: {len(config.ADMIN_IDS)} admins")
+
+    async def _import_keywords_file(self):
+        path = config.KEYWORDS_FILE
+        current = self._mtime(path)
+        if current == self._keywords_mtime:
+            return
+        self._keywords_mtime = current
+        if current is None:
+            return  # Deleting the file changes nothing
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                items = list(json.load(f))
+        except Exception as e:
+            # Possibly caught mid-write; retried when the mtime changes again
+            logger.warning(f"Could not read {path}: {str(e)}")
+            return
+
+        added = await config.STORE.add_keywords(str(item) for item in items)
+        logger.info(f"♻️ Imported {path}: {len(added)} keywords added")
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from telethon.errors import FloodWaitError
+
+import metrics
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+STATE_SETTING = 'scan_job'
+
+_DURATION_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_since(text: str, now: Optional[float] = None) -> float:
+    """Turn '30m', '12h', '7d', '2w' or a date like '2024-05-01' into a Unix timestamp."""
+    text = text.strip().lower()
+    match = re.fullmatch(r'(\d+)([mhdw])', text)
+    if match:
+        return (now or time.time()) - int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+    try:
+        date = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid time '{text}', use e.g. 12h, 7d or 2024-05-01")
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+class HistoryEvent:
+    """Presents a message from ``iter_messages`` like the NewMessage event UserBot handles."""
+
+    __slots__ = ('message',)
+
+    def __init__(self, message):
+        self.message = message
+
+    def __getattr__(self, name):
+        return getattr(self.message, name)
+
+
+class ScanJob:
+    """A scan of the history of some chats, from ``since`` up to when it was started.
+
+    ``offsets`` holds the ID of the newest message scanned in each chat. The
+    job is checkpointed after every batch, so an interrupted scan continues
+    after the last finished batch instead of starting over.
+    """
+
+    def __init__(self, job_id: str, chats: List[int], since: float,
+                 created_at: Optional[float] = None, status: str = 'running'):
+        self.job_id = job_id
+        self.chats = chats
+        self.since = since
+        self.created_at = created_at or time.time()
+        self.status = status
+        self.offsets: Dict[int, int] = {}
+        self.done = set()
+        self.failed: Dict[int, str] = {}
+        self.scanned = 0
+        self.matched = 0
+
+    @property
+    def total(self) -> int:
+        return len(self.chats)
+
+    @property
+    def remaining(self) -> int:
+        return self.total - len(self.done)
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.job_id,
+            'chats': self.chats,
+            'since': self.since,
+            'created_at': self.created_at,
+            'status': self.status,
+            'offsets': {str(chat_id): offset for chat_id, offset in self.offsets.items()},
+            'done': sorted(self.done),
+            'failed': {str(chat_id): error for chat_id, error in self.failed.items()},
+            'scanned': self.scanned,
+            'matched': self.matched,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ScanJob':
+        job = cls(data['job_id'], data['chats'], data['since'],
+                  data.get('created_at'), data.get('status', 'running'))
+        job.offsets = {int(chat_id): offset for chat_id, offset in data.get('offsets', {}).items()}
+        job.done = set(data.get('done', []))
+        job.failed = {int(chat_id): error for chat_id, error in data.get('failed', {}).items()}
+        job.scanned = data.get('scanned', 0)
+        job.matched = data.get('matched', 0)
+        return job
+
+    def progress_text(self) -> str:
+        """Human readable progress summary."""
+        elapsed = int(time.time() - self.created_at)
+        since = datetime.fromtimestamp(self.since, timezone.utc).strftime('%Y-%m-%d %H:%M')
+        return (f"🔎 Scan {self.job_id} ({self.status}) since {since} UTC\n"
+                f"Chats: {len(self.done)}/{self.total} | Messages: {self.scanned} | "
+                f"Matches: {self.matched} | Failed: {len(self.failed)}\n"
+                f"Elapsed: {elapsed // 60}m {elapsed % 60}s")
+
+
+class HistoryScanner:
+    """Run history scans in the background, checkpointed in the store.
+
+    Chats are scanned one after the other, oldest message first, by
+    streaming ``history(chat_id, since, offset_id)``. Every batch of
+    ``batch_size`` messages takes a token from a bucket refilled at
+    ``rate`` batches per second, and no batch starts while ``busy()`` says
+    live matches are queueing up, so a scan never starves live monitoring.
+    """
+
+    def __init__(
+        self,
+        history: Callable[[int, float, int], AsyncIterator],
+        process: Callable[[object], Awaitable[bool]],
+        store,
+        rate: float = 1.0,
+        batch_size: int = 100,
+        busy: Optional[Callable[[], bool]] = None,
+    ):
+        self._history = history
+        self._process = process
+        self.store = store
+        self.bucket = TokenBucket(rate, 1)
+        self.batch_size = max(1, batch_size)
+        self._busy = busy or (lambda: False)
+        self.job: Optional[ScanJob] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start_job(self, chats: List[int], since: float,
+                        on_done: Optional[Callable[[ScanJob], Awaitable[None]]] = None) -> ScanJob:
+        """Persist a new scan and start it in the background."""
+        if self.running:
+            raise RuntimeError("A scan is already running")
+
+        job = ScanJob(uuid.uuid4().hex[:8], list(dict.fromkeys(chats)), since)
+        await self._checkpoint(job)
+        self._launch(job, on_done)
+        return job
+
+    def resume(self, on_done: Optional[Callable[[ScanJob], Awaitable[None]]] = None) -> Optional[ScanJob]:
+        """Resume an interrupted scan from the store, if there is one."""
+        if self.running:
+            return None
+
+        data = self.store.get_setting(STATE_SETTING)
+        if not data:
+            return None
+        try:
+            job = ScanJob.from_dict(data)
+        except Exception as e:
+            logger.error(f"Could not load scan state: {str(e)}")
+            return None
+
+        self.job = job
+        if job.status != 'running':
+            return None
+
+        logger.info(f"Resuming scan {job.job_id}: {job.remaining} of {job.total} chats left")
+        self._launch(job, on_done)
+        return job
+
+    def cancel(self) -> bool:
+        """Stop the running scan; it will not be resumed."""
+        if not self.running:
+            return False
+        self.job.status = 'cancelled'
+        self._task.cancel()
+        return True
+
+    async def stop(self):
+        """Pause the running scan for shutdown; it resumes on the next start."""
+        if self.running:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def progress_text(self) -> str:
+        if self.job is None:
+            return "No scan has been started yet."
+        return self.job.progress_text()
+
+    def _launch(self, job: ScanJob, on_done):
+        self.job = job
+        self._task = asyncio.create_task(self._run(job, on_done), name=f"scan-{job.job_id}")
+
+    async def _checkpoint(self, job: ScanJob):
+        await self.store.set_setting(STATE_SETTING, job.to_dict())
+
+    async def _throttle(self):
+        # Live matches waiting for delivery go first
+        while self._busy():
+            await asyncio.sleep(0.5)
+        await self.bucket.acquire()
+
+    async def _scan_chat(self, job: ScanJob, chat_id: int):
+        batch = 0
+        async for message in self._history(chat_id, job.since, job.offsets.get(chat_id, 0)):
+            if message.date is not None and message.date.timestamp() > job.created_at:
+                break  # Everything newer was seen by live monitoring
+            if batch == 0:
+                await self._throttle()
+
+            if message.text and await self._process(HistoryEvent(message)):
+                job.matched += 1
+            job.offsets[chat_id] = message.id
+            job.scanned += 1
+            metrics.SCAN_MESSAGES.inc()
+
+            batch += 1
+            if batch >= self.batch_size:
+                await self._checkpoint(job)
+                batch = 0
+
+    async def _run(self, job: ScanJob, on_done):
+        try:
+            for chat_id in job.chats:
+                if chat_id in job.done:
+                    continue
+                while True:
+                    try:
+                        await self._scan_chat(job, chat_id)
+                    except FloodWaitError as e:
+                        # Continue from the last message once the wait is over
+                        metrics.FLOOD_WAITS.inc()
+                        logger.warning(f"Scan of {chat_id} hit a FloodWait of {e.seconds}s")
+                        await asyncio.sleep(e.seconds)
+                        continue
+                    except Exception as e:
+                        job.failed[chat_id] = str(e) or e.__class__.__name__
+                        logger.warning(f"Scan of {chat_id} failed: {job.failed[chat_id]}")
+                    break
+                job.done.add(chat_id)
+                await self._checkpoint(job)
+            job.status = 'done'
+        finally:
+            # A shutdown leaves the job as 'running' so that it is resumed
+            try:
+                await asyncio.shield(self._checkpoint(job))
+            except Exception as e:
+                logger.error(f"Could not save scan state: {str(e)}")
+
+        logger.info(f"Scan {job.job_id} finished: {job.scanned} messages, {job.matched} matches, "
+                    f"{len(job.failed)} chats failed")
+        if on_done is not None:
+            try:
+                await on_done(job)
+            except Exception as e:
+                logger.error(f"Error reporting scan result: {str(e)}")
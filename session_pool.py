@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+from telethon import utils
+from telethon.errors import FloodWaitError
+from telethon.tl.types import PeerChannel
+
+from dialog_index import DialogIndex
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    """One Telegram account of the pool and its health/flood bookkeeping."""
+
+    def __init__(self, name: str, dialog_file: str, send_rate: float, send_burst: float):
+        self.name = name
+        self.client = None
+        self.dialogs = DialogIndex(dialog_file)
+        self.me = None
+        self.me_id = None
+        self.target = None  # This account's input entity for the target channel
+        self.budget = TokenBucket(send_rate, send_burst)
+        self.flood_until = 0.0
+        self.sent = 0
+        self.flood_waits = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.client is not None and self.client.is_connected()
+
+    @property
+    def flood_remaining(self) -> float:
+        return max(0.0, self.flood_until - time.monotonic())
+
+    def status_line(self) -> str:
+        if self.me is None:
+            return f"❌ {self.name}: not started ({self.last_error or 'unknown error'})"
+        state = "✅" if self.connected else "⚠️ disconnected"
+        line = (
+            f"{state} {self.name}: {self.me.first_name} "
+            f"(@{self.me.username if self.me.username else 'No username'}) - ID: {self.me.id}\n"
+            f"   chats: {len(self.dialogs)}, sent: {self.sent}, FloodWaits: {self.flood_waits}"
+        )
+        if self.flood_remaining:
+            line += f", flood wait: {self.flood_remaining:.0f}s"
+        if self.last_error:
+            line += f"\n   last error: {self.last_error}"
+        return line
+
+
+class SessionPool:
+    """Several userbot accounts working as one.
+
+    The first session is the primary: it handles account-level commands
+    (/info, entity lookups). Sends are routed to the eligible session with
+    the most spare send budget that is not in a FloodWait, failing over to
+    the next one when Telegram answers with FloodWait. New chats are joined
+    by the session that is in the fewest chats.
+
+    Chats shared by several sessions deliver every message once per session;
+    ``claim`` lets only one copy through.
+    """
+
+    def __init__(self, names: List[str], client_factory: Callable[[str], object],
+                 dialog_file: str, send_rate: float, send_burst: float, seen_size: int = 20000):
+        self.client_factory = client_factory
+        self.sessions = [
+            Session(name, self._dialog_file(dialog_file, index, name), send_rate, send_burst)
+            for index, name in enumerate(names)
+        ]
+        self._seen = OrderedDict()
+        self._seen_size = seen_size
+
+    @staticmethod
+    def _dialog_file(dialog_file: str, index: int, name: str) -> str:
+        # The primary keeps the original file name, so existing indexes stay valid
+        if index == 0:
+            return dialog_file
+        base, dot, extension = dialog_file.rpartition('.')
+        return f"{base}_{name}.{extension}" if dot else f"{dialog_file}_{name}"
+
+    @property
+    def primary(self) -> Session:
+        return self.sessions[0]
+
+    @property
+    def running(self) -> List[Session]:
+        return [session for session in self.sessions if session.me is not None]
+
+    def get(self, name: Optional[str]) -> Optional[Session]:
+        for session in self.sessions:
+            if session.name == name:
+                return session
+        return None
+
+    async def start(self):
+        """Connect all sessions concurrently; the primary must succeed, others may fail."""
+        results = await asyncio.gather(
+            *(self._start_session(session) for session in self.sessions), return_exceptions=True
+        )
+        for session, result in zip(self.sessions, results):
+            if isinstance(result, Exception):
+                session.last_error = str(result)
+                if session is self.primary:
+                    raise result
+                logger.error(f"❌ Session {session.name} failed to start: {str(result)}")
+
+    async def _start_session(self, session: Session):
+        session.client = self.client_factory(session.name)
+        await session.client.start()
+        session.me = await session.client.get_me()
+        session.me_id = session.me.id
+        logger.info(f"🟢 Session {session.name} connected as {session.me_id}")
+
+    async def stop(self):
+        await asyncio.gather(*(session.dialogs.flush() for session in self.sessions))
+        await asyncio.gather(
+            *(session.client.disconnect() for session in self.sessions if session.client is not None),
+            return_exceptions=True
+        )
+
+    def claim(self, event) -> bool:
+        """True for the first session to see a message, False for copies from other sessions."""
+        if len(self.sessions) == 1:
+            return True
+        chat_id, message = event.chat_id, event.message
+        if utils.resolve_id(chat_id)[1] is PeerChannel:
+            key = (chat_id, message.id)
+        else:
+            # Outside channels message IDs are numbered per account, so copies
+            # are recognized by sender, date and text instead
+            date = message.date.timestamp() if message.date else None
+            key = (chat_id, event.sender_id, date, hash(message.text or ''))
+        if key in self._seen:
+            return False
+        self._seen[key] = None
+        if len(self._seen) > self._seen_size:
+            self._seen.popitem(last=False)
+        return True
+
+    def members(self, chat_id: int) -> List[Session]:
+        return [session for session in self.running if chat_id in session.dialogs]
+
+    def least_loaded(self) -> Session:
+        """The connected session that is in the fewest chats."""
+        candidates = [session for session in self.running if session.connected] or [self.primary]
+        return min(candidates, key=lambda session: len(session.dialogs))
+
+    def _candidates(self, eligible: Optional[Callable[[Session], bool]]) -> List[Session]:
+        sessions = [
+            session for session in self.running
+            if session.connected and (eligible is None or eligible(session))
+        ]
+        # Sessions out of FloodWait first, then the most spare send budget
+        return sorted(sessions, key=lambda session: (session.flood_remaining > 0, -session.budget.tokens))
+
+    async def run(self, call: Callable[[Session], Awaitable], eligible: Optional[Callable[[Session], bool]] = None):
+        """Run ``call(session)`` on the best eligible session.
+
+        Sessions in a FloodWait are never called. Of the others, one with
+        send budget left is used; if all have spent theirs, the call waits
+        for the fullest one. A FloodWait puts that session aside and the call
+        is retried on the next one. When every eligible session is flooded a
+        FloodWaitError with the shortest remaining wait is raised, so callers
+        keep their own retry logic.
+        """
+        candidates = self._candidates(eligible)
+        if not candidates:
+            raise RuntimeError("No connected session can handle this request")
+
+        error = None
+        while True:
+            ready = [session for session in candidates if not session.flood_remaining]
+            if not ready:
+                if error is not None:
+                    raise error
+                wait = min(session.flood_remaining for session in candidates)
+                raise FloodWaitError(None, capture=math.ceil(wait))
+
+            session = next((session for session in ready if session.budget.try_acquire()), None)
+            if session is None:
+                session = ready[0]  # Sorted by spare budget
+                await session.budget.acquire()
+            try:
+                result = await call(session)
+            except FloodWaitError as e:
+                session.flood_until = time.monotonic() + e.seconds
+                session.flood_waits += 1
+                session.last_error = f"FloodWait {e.seconds}s"
+                logger.warning(f"⏳ Session {session.name} hit a FloodWait of {e.seconds}s")
+                candidates.remove(session)
+                error = e
+                continue
+            session.sent += 1
+            return result
+
+    def status_text(self) -> str:
+        lines = [f"👥 Sessions: {len(self.running)}/{len(self.sessions)} running"]
+        lines.extend(session.status_line() for session in self.sessions)
+        return "\n".join(lines)
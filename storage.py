@@ -0,0 +1,470 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from normalizer import normalize_text
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keywords (
+    keyword TEXT PRIMARY KEY,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS admins (
+    user_id INTEGER PRIMARY KEY,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS match_history (
+    id INTEGER PRIMARY KEY,
+    matched_at REAL NOT NULL,
+    chat_id INTEGER,
+    message_id INTEGER,
+    sender_id INTEGER,
+    keywords TEXT NOT NULL,
+    text TEXT NOT NULL,
+    chat_title TEXT,
+    sender_name TEXT
+);
+CREATE INDEX IF NOT EXISTS match_history_matched_at ON match_history (matched_at);
+CREATE TABLE IF NOT EXISTS hit_counters (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    minute INTEGER NOT NULL,
+    hour INTEGER NOT NULL,
+    minutes BLOB NOT NULL,
+    hours BLOB NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+"""
+
+# Columns added to existing tables after their first release
+MIGRATIONS = {
+    'match_history': [('chat_title', 'TEXT'), ('sender_name', 'TEXT')],
+}
+
+# Full-text index of the match history. It holds the normalized message text
+# under the row's ID and nothing else (contentless), so it adds no second
+# copy of the text.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS match_fts USING fts5(body, content='', tokenize='unicode61');
+"""
+
+MATCH_COLUMNS = "id, matched_at, chat_id, message_id, sender_id, keywords, text, chat_title, sender_name"
+
+
+class Storage:
+    """SQLite (WAL mode) store for keywords, admins, settings and match history.
+
+    Reads use their own connection and are cheap enough to run on the event
+    loop. Writes are small transactions executed one at a time on a
+    dedicated thread, so the loop never waits for the disk; the ``async``
+    methods return once the transaction is committed.
+
+    Every change to keywords or admins bumps a version number in the same
+    transaction, so readers can tell cheaply whether they need to reload.
+
+    Matches are not written one by one: ``record_match`` only queues the row
+    and matches arriving within ``match_flush_delay`` seconds are inserted,
+    together with their full-text index entries, in one transaction.
+    """
+
+    def __init__(self, path: str, match_flush_delay: float = 1.0, match_batch_size: int = 500):
+        self.path = path
+        self.match_flush_delay = match_flush_delay
+        self.match_batch_size = match_batch_size
+        self.fts = False  # Whether SQLite has FTS5; search falls back to LIKE otherwise
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._searcher: Optional[sqlite3.Connection] = None  # Only used on the search thread
+        self._write_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage')
+        self._search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='storage-search')
+        self._pending_matches: List[tuple] = []
+        self._match_flush: Optional[asyncio.Task] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        self._migrate(self._writer)
+        self._reader = self._connect()
+        self._searcher = self._connect()
+
+    def _migrate(self, connection: sqlite3.Connection):
+        for table, columns in MIGRATIONS.items():
+            existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            for name, declaration in columns:
+                if name not in existing:
+                    connection.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+
+        try:
+            connection.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite without FTS5 ({str(e)}), /search will scan the history")
+            return
+        self.fts = True
+
+        # Index history recorded before the full-text index existed
+        if connection.execute("SELECT 1 FROM match_fts LIMIT 1").fetchone() is None:
+            rows = connection.execute("SELECT id, text FROM match_history").fetchall()
+            if rows:
+                self._transaction(lambda c: c.executemany(
+                    "INSERT INTO match_fts (rowid, body) VALUES (?, ?)",
+                    [(row_id, normalize_text(text)) for row_id, text in rows]
+                ))
+                logger.info(f"Indexed {len(rows)} matches for full-text search")
+
+    def close(self):
+        self._search_executor.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+        if self._pending_matches and self._writer is not None:
+            # The event loop is gone by now, so write what is left directly
+            rows, self._pending_matches = self._pending_matches, []
+            self._transaction(self._insert_matches, rows)
+        for connection in (self._reader, self._writer, self._searcher):
+            if connection is not None:
+                connection.close()
+        self._reader = self._writer = self._searcher = None
+
+    # -- Transactions ------------------------------------------------------
+
+    def _transaction(self, function: Callable[..., Any], *args) -> Any:
+        """Run ``function(connection, *args)`` in one IMMEDIATE transaction."""
+        with self._write_lock:
+            connection = self._writer
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = function(connection, *args)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return result
+
+    async def _write(self, function: Callable[..., Any], *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._transaction, function, *args)
+
+    @staticmethod
+    def _bump(connection: sqlite3.Connection, name: str):
+        connection.execute(
+            "INSERT INTO versions (name, version) VALUES (?, 1) "
+            "ON CONFLICT (name) DO UPDATE SET version = version + 1",
+            (name,)
+        )
+
+    # -- Reads -------------------------------------------------------------
+
+    def data_version(self) -> int:
+        """Changes whenever any other connection (or process) commits to the database."""
+        return self._reader.execute("PRAGMA data_version").fetchone()[0]
+
+    def version(self, name: str) -> int:
+        """Change counter of ``name`` ('keywords' or 'admins'); 0 if never written."""
+        row = self._reader.execute("SELECT version FROM versions WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def keywords(self) -> List[str]:
+        """All keywords in the order they were added."""
+        return [row[0] for row in self._reader.execute("SELECT keyword FROM keywords ORDER BY rowid")]
+
+    def admins(self) -> List[int]:
+        return [row[0] for row in self._reader.execute("SELECT user_id FROM admins ORDER BY rowid")]
+
+    def keywords_added_at(self) -> Dict[str, float]:
+        return dict(self._reader.execute("SELECT keyword, added_at FROM keywords"))
+
+    def hit_counters(self) -> List[tuple]:
+        """Saved rolling hit counters as ``(kind, key, minute, hour, minutes, hours)``."""
+        return self._reader.execute("SELECT kind, key, minute, hour, minutes, hours FROM hit_counters").fetchall()
+
+    def get_setting(self, name: str, default: Any = None) -> Any:
+        row = self._reader.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    @staticmethod
+    def _match_dict(row: tuple) -> dict:
+        row_id, matched_at, chat_id, message_id, sender_id, keywords, text, chat_title, sender_name = row
+        return {
+            'id': row_id,
+            'matched_at': matched_at,
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'sender_id': sender_id,
+            'keywords': json.loads(keywords),
+            'text': text,
+            'chat_title': chat_title,
+            'sender_name': sender_name,
+        }
+
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        """Every word of ``query`` must occur; a trailing * makes a word a prefix."""
+        terms = []
+        for word in normalize_text(query).split():
+            prefix = word.endswith('*')
+            word = word.rstrip('*').replace('"', '""')
+            if word:
+                terms.append(f'"{word}"*' if prefix else f'"{word}"')
+        return " ".join(terms)
+
+    async def search_matches(self, query: str, keyword: Optional[str] = None, since: Optional[float] = None,
+                             limit: int = 10, offset: int = 0,
+                             scan_limit: int = 100000) -> Tuple[List[dict], bool]:
+        """Newest matches containing all words of ``query``; returns (rows, has_more).
+
+        ``keyword`` limits the results to matches of that keyword and
+        ``since`` (a Unix timestamp) to matches recorded after it. Without
+        FTS5 the history is scanned with LIKE, so only the newest
+        ``scan_limit`` matches are searched. The query runs on its own thread
+        and connection, never on the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._search_executor, self._search, query, keyword, since, limit, offset, scan_limit
+        )
+
+    def _search(self, query: str, keyword: Optional[str], since: Optional[float],
+                limit: int, offset: int, scan_limit: int) -> Tuple[List[dict], bool]:
+        connection = self._searcher
+        conditions, params = [], []
+        if self.fts:
+            fts_query = self._fts_query(query)
+            if not fts_query:
+                return [], False
+            source = "match_fts JOIN match_history m ON m.id = match_fts.rowid"
+            conditions.append("match_fts MATCH ?")
+            params.append(fts_query)
+            order = "match_fts.rowid"
+        else:
+            source = "match_history m"
+            # A range on the primary key bounds the scan to the newest rows
+            newest = connection.execute("SELECT MAX(id) FROM match_history").fetchone()[0] or 0
+            conditions.append("m.id > ?")
+            params.append(newest - scan_limit)
+            for word in query.split():
+                conditions.append("m.text LIKE ?")
+                params.append(f"%{word}%")
+            order = "m.id"
+        if keyword:
+            # Keywords are stored as a JSON list; look for the exact JSON string
+            conditions.append("instr(m.keywords, ?) > 0")
+            params.append(json.dumps(keyword, ensure_ascii=False))
+        if since is not None:
+            conditions.append("m.matched_at >= ?")
+            params.append(since)
+
+        columns = ", ".join(f"m.{column.strip()}" for column in MATCH_COLUMNS.split(","))
+        rows = connection.execute(
+            f"SELECT {columns} FROM {source} WHERE {' AND '.join(conditions) or '1'} "
+            f"ORDER BY {order} DESC LIMIT ? OFFSET ?",
+            params + [limit + 1, offset]
+        ).fetchall()
+        return [self._match_dict(row) for row in rows[:limit]], len(rows) > limit
+
+    # -- Writes ------------------------------------------------------------
+
+    @classmethod
+    def _insert_keywords(cls, connection: sqlite3.Connection, keywords: Iterable[str]) -> List[str]:
+        added = []
+        now = time.time()
+        for keyword in keywords:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO keywords (keyword, added_at) VALUES (?, ?)", (keyword, now)
+            )
+            if cursor.rowcount:
+                added.append(keyword)
+        if added:
+            cls._bump(connection, 'keywords')
+        return added
+
+    @classmethod
+    def _delete_keywords(cls, connection: sqlite3.Connection, keywords: Iterable[str]) -> List[str]:
+        removed = []
+        for keyword in keywords:
+            if connection.execute("DELETE FROM keywords WHERE keyword = ?", (keyword,)).rowcount:
+                connection.execute("DELETE FROM hit_counters WHERE kind = 'keyword' AND key = ?", (keyword,))
+                removed.append(keyword)
+        if removed:
+            cls._bump(connection, 'keywords')
+        return removed
+
+    @classmethod
+    def _replace_admins(cls, connection: sqlite3.Connection, user_ids: Iterable[int]):
+        connection.execute("DELETE FROM admins")
+        now = time.time()
+        connection.executemany(
+            "INSERT OR IGNORE INTO admins (user_id, added_at) VALUES (?, ?)",
+            [(user_id, now) for user_id in user_ids]
+        )
+        cls._bump(connection, 'admins')
+
+    async def add_keywords(self, keywords: Iterable[str]) -> List[str]:
+        """Insert keywords; returns the ones that were not stored yet."""
+        return await self._write(self._insert_keywords, list(keywords))
+
+    async def remove_keywords(self, keywords: Iterable[str]) -> List[str]:
+        """Delete keywords (and their hit counters); returns the ones that existed."""
+        return await self._write(self._delete_keywords, list(keywords))
+
+    async def add_admin(self, user_id: int) -> bool:
+        def write(connection):
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO admins (user_id, added_at) VALUES (?, ?)", (user_id, time.time())
+            )
+            if cursor.rowcount:
+                self._bump(connection, 'admins')
+            return bool(cursor.rowcount)
+        return await self._write(write)
+
+    async def remove_admin(self, user_id: int) -> bool:
+        def write(connection):
+            cursor = connection.execute("DELETE FROM admins WHERE user_id = ?", (user_id,))
+            if cursor.rowcount:
+                self._bump(connection, 'admins')
+            return bool(cursor.rowcount)
+        return await self._write(write)
+
+    async def set_admins(self, user_ids: Iterable[int]):
+        await self._write(self._replace_admins, list(user_ids))
+
+    async def set_setting(self, name: str, value: Any):
+        await self._write(
+            lambda connection: connection.execute(
+                "INSERT INTO settings (name, value) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                (name, json.dumps(value, ensure_ascii=False))
+            )
+        )
+
+    async def save_hit_counters(self, rows: List[tuple]):
+        """Upsert a batch of rolling hit counters in one transaction."""
+        await self._write(
+            lambda connection: connection.executemany(
+                "INSERT INTO hit_counters (kind, key, minute, hour, minutes, hours) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, key) DO UPDATE SET minute = excluded.minute, hour = excluded.hour, "
+                "minutes = excluded.minutes, hours = excluded.hours",
+                rows
+            )
+        )
+
+    def _insert_matches(self, connection: sqlite3.Connection, rows: List[tuple]):
+        for row in rows:
+            cursor = connection.execute(
+                "INSERT INTO match_history (matched_at, chat_id, message_id, sender_id, keywords, text, "
+                "chat_title, sender_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                row
+            )
+            if self.fts:
+                connection.execute(
+                    "INSERT INTO match_fts (rowid, body) VALUES (?, ?)", (cursor.lastrowid, normalize_text(row[5]))
+                )
+
+    def record_match(self, chat_id: int, message_id: int, sender_id: Optional[int], keywords: List[str],
+                     text: str, chat_title: Optional[str] = None, sender_name: Optional[str] = None,
+                     matched_at: Optional[float] = None):
+        """Queue a match for the history; it is written with others in the next batch.
+
+        ``matched_at`` is the message's own date (defaults to now), so matches
+        found in old history by /scan are filed at the time they were sent.
+        """
+        self._pending_matches.append((
+            matched_at or time.time(), chat_id, message_id, sender_id, json.dumps(keywords, ensure_ascii=False), text,
+            chat_title, sender_name
+        ))
+        if self._match_flush is None or self._match_flush.done():
+            self._match_flush = asyncio.get_running_loop().create_task(self._flush_matches())
+
+    async def _flush_matches(self):
+        # Matches arriving in the same burst share one transaction
+        await asyncio.sleep(self.match_flush_delay)
+        while self._pending_matches:
+            rows = self._pending_matches[:self.match_batch_size]
+            del self._pending_matches[:len(rows)]
+            try:
+                await self._write(self._insert_matches, rows)
+            except Exception as e:
+                logger.error(f"Could not record {len(rows)} matches in history: {str(e)}")
+
+    async def flush_matches(self):
+        """Write the queued matches now (used on shutdown)."""
+        if self._match_flush is not None and not self._match_flush.done():
+            self._match_flush.cancel()
+            await asyncio.gather(self._match_flush, return_exceptions=True)
+        self._match_flush = None
+        if self._pending_matches:
+            rows, self._pending_matches = self._pending_matches, []
+            await self._write(self._insert_matches, rows)
+
+    # -- Migration ---------------------------------------------------------
+
+    def import_legacy(self, keywords_file: str, admins_file: str,
+                      default_keywords: List[str], default_admins: List[int]):
+        """Seed a new database once, from the old JSON files or the defaults.
+
+        Runs synchronously at startup, before the event loop is up.
+        """
+        if self.get_setting('initialized'):
+            return
+
+        keywords = self._read_json_list(keywords_file)
+        if keywords is None:
+            keywords = default_keywords
+        admins = self._read_json_list(admins_file)
+        if admins is None:
+            admins = default_admins
+        # Telegram user IDs are positive; 0 is the placeholder of an unset ADMIN_ID
+        user_ids = []
+        for item in admins:
+            try:
+                user_id = int(item)
+            except (TypeError, ValueError):
+                user_id = 0
+            if user_id > 0:
+                user_ids.append(user_id)
+            else:
+                logger.warning(f"Skipping invalid admin ID: {item!r}")
+        admins = user_ids
+
+        def write(connection):
+            self._insert_keywords(connection, keywords)
+            self._replace_admins(connection, admins)
+            connection.execute("INSERT OR REPLACE INTO settings (name, value) VALUES ('initialized', 'true')")
+        self._transaction(write)
+        logger.info(f"Database {self.path} initialized with {len(keywords)} keywords and {len(admins)} admins")
+
+    @staticmethod
+    def _read_json_list(path: str) -> Optional[list]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return list(json.load(f))
+        except Exception as e:
+            logger.error(f"Could not import {path}: {str(e)}")
+            return None
@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+
+from telethon.errors import ChatForwardsRestrictedError
+
+from native_forward import ForwardBatcher, ForwardItem
+
+
+def _item(message_id):
+    return ForwardItem(SimpleNamespace(message=SimpleNamespace(id=message_id)), None)
+
+
+def test_restricted_chat_falls_back_to_copies():
+    calls = []
+    copied = []
+
+    async def forward(chat_id, items):
+        calls.append(chat_id)
+        raise ChatForwardsRestrictedError(request=None)
+
+    async def fallback(chat_id, items):
+        copied.append((chat_id, [item.message_id for item in items]))
+
+    async def run():
+        batcher = ForwardBatcher(forward, window=0.01, fallback=fallback)
+        await batcher.add(-1001, _item(1))
+        await batcher.add(-1001, _item(2))
+        await batcher.close()
+        return batcher
+
+    batcher = asyncio.run(run())
+    assert calls == [-1001]  # Not retried
+    assert copied == [(-1001, [1, 2])]
+    assert -1001 in batcher.restricted
+
+
+def test_close_waits_for_batch_in_flight():
+    forwarded = []
+
+    async def forward(chat_id, items):
+        await asyncio.sleep(0.05)
+        forwarded.extend(item.message_id for item in items)
+
+    async def run():
+        batcher = ForwardBatcher(forward, window=0)
+        await batcher.add(-1001, _item(1))
+        await asyncio.sleep(0.01)  # The timer has fired and the forward is running
+        await batcher.close()
+
+    asyncio.run(run())
+    assert forwarded == [1]
@@ -1,125 +1,708 @@
 import asyncio
+import functools
+import logging
 import re
-from datetime import datetime
-from telethon import TelegramClient, events
-from telethon.tl.types import User, Channel, Chat
+import time
+from datetime import datetime, timezone
+from telethon import TelegramClient, events, utils
+from telethon.tl.types import (
+    User, Channel, Chat, PeerChannel, UpdateChannel, UpdateChannelParticipant,
+    InputUser, InputUserSelf, InputPeerUser, InputUserFromMessage
+)
 from telethon.tl.functions.channels import JoinChannelRequest, LeaveChannelRequest
-from telethon.tl.functions.messages import ImportChatInviteRequest
+from telethon.tl.functions.messages import ImportChatInviteRequest, DeleteChatUserRequest
 from telethon.errors import ChatAdminRequiredError, ChannelPrivateError, UserNotParticipantError, FloodWaitError
 
 import config
+import metrics
+from analytics import HitAnalytics
+from broadcast import BroadcastEngine
+from chat_filters import ChatFilters
+from dedup import DuplicateFilter
+from digest import DigestBuffer, MAX_MESSAGE_LENGTH
+from entity_cache import EntityCache
+from forwarder import Forwarder, ForwardJob
+from matcher import KeywordMatcher
+from metadata_cache import MetadataCache
+from native_forward import ForwardBatcher, ForwardItem
+from normalizer import normalize_text
+from scanner import HistoryScanner, parse_since
+from session_pool import SessionPool
+
+logger = logging.getLogger(__name__)
+# Structured match/forward records, so they can be routed and leveled separately
+match_logger = logging.getLogger('userbot.matches')
 
 class UserBot:
-    def __init__(self):
-        """Initialize the UserBot with Telethon client."""
+    def __init__(self, client_factory=None):
+        """Initialize the UserBot with its pool of Telethon sessions.
+        
+        ``client_factory(session_name)`` creates one client per name in
+        config.USERBOT_SESSIONS on start; it defaults to a TelegramClient on
+        that session and can be replaced, e.g. by the load harness in
+        benchmarks/. ``self.client`` is the primary session's client.
+        """
         self.client = None
+        self.client_factory = client_factory or self._create_client
+        self.pool = SessionPool(
+            config.USERBOT_SESSIONS,
+            lambda name: self.client_factory(name),
+            config.DIALOG_INDEX_FILE,
+            send_rate=config.SESSION_SEND_RATE,
+            send_burst=config.SESSION_SEND_BURST,
+        )
         self.running = False
         self.bot_client = None  # Will be set later by main.py
+        self.matcher = KeywordMatcher(config.KEYWORDS)
+        self.keywords_version = config.STORE.version('keywords')
+        self._reload_lock = asyncio.Lock()
+        self.chat_filters = ChatFilters(config.CHAT_FILTERS_FILE)
+        self.chat_filters.load()
+        self.chat_filters.rebuild(config.KEYWORDS)
+        self.entity_cache = EntityCache(config.ENTITY_CACHE_SIZE, config.ENTITY_CACHE_TTL)
+        self._pending_lookups = {}
+        self.metadata = MetadataCache(self._call, max_size=config.METADATA_CACHE_SIZE)
+        self.forwarder = Forwarder(
+            self._deliver_match,
+            workers=config.FORWARD_WORKERS,
+            queue_size=config.FORWARD_QUEUE_SIZE,
+            max_retries=config.FORWARD_MAX_RETRIES,
+            on_failed=lambda job: self._forget_duplicate(job.dedup),
+        )
+        metrics.QUEUE_DEPTH.set_function(lambda: self.forwarder.depth)
+        self.dedup = DuplicateFilter(config.DEDUP_WINDOW, config.DEDUP_MAX_ENTRIES) if config.DEDUP_ENABLED else None
+        self._background_tasks = set()
+        self.digest_enabled = config.DIGEST_MODE
+        self.analytics = HitAnalytics()
+        self._analytics_task = None
+        self.digest = DigestBuffer(self._send_to_target, config.DIGEST_WINDOW, config.DIGEST_HEADER)
+        self.native_forward = config.FORWARD_MODE == 'native'
+        self.forward_batcher = ForwardBatcher(
+            self._forward_batch,
+            config.NATIVE_FORWARD_WINDOW,
+            on_dropped=lambda chat_id, items: [self._forget_duplicate(item.dedup) for item in items],
+            fallback=self._copy_forward_items,
+        )
+        self.broadcaster = BroadcastEngine(
+            self._send_broadcast,
+            config.BROADCAST_STATE_FILE,
+            rate=config.BROADCAST_RATE,
+            burst=config.BROADCAST_BURST,
+            concurrency=config.BROADCAST_CONCURRENCY,
+            max_flood_wait=config.BROADCAST_MAX_FLOOD_WAIT,
+        )
+        self.scanner = HistoryScanner(
+            self._iter_history,
+            lambda event: self.process_message(event, forward=config.SCAN_FORWARD),
+            config.STORE,
+            rate=config.SCAN_RATE,
+            batch_size=config.SCAN_BATCH_SIZE,
+            busy=lambda: self.forwarder.depth > self.forwarder.queue_size // 2,
+        )
+    
+    @staticmethod
+    def _create_client(session_name):
+        return TelegramClient(session_name, config.API_ID, config.API_HASH)
     
     async def start(self):
-        """Start the UserBot client."""
-        self.client = TelegramClient('userbot_session', config.API_ID, config.API_HASH)
-        await self.client.start()
+        """Start all UserBot sessions; only the primary one is required."""
+        await self.pool.start()
+        self.client = self.pool.primary.client
         self.running = True
         
+        # Matches are delivered by a pool of workers, not by the event handlers
+        self.forwarder.start()
+        
+        # Hit counters continue from where the last run saved them
+        self.analytics.load(config.STORE.hit_counters())
+        if config.STORE.get_setting('analytics_started_at') is None:
+            await config.STORE.set_setting('analytics_started_at', time.time())
+        self._analytics_task = asyncio.create_task(self._save_analytics_periodically())
+        
+        await asyncio.gather(*(self._start_session(session) for session in self.pool.running))
+        
+        # Pick up a broadcast that was interrupted by a crash or restart
+        job = self.broadcaster.resume()
+        if job:
+            logger.info(f"📣 Resuming broadcast {job.job_id}: {job.remaining} of {job.total} chats left")
+        # ... and a history scan
+        job = self.scanner.resume()
+        if job:
+            logger.info(f"🔎 Resuming scan {job.job_id}: {job.remaining} of {job.total} chats left")
+        
+        logger.info(f"🟢 UserBot has started successfully with {len(self.pool.running)} session(s)!")
+        return self.client
+    
+    async def _start_session(self, session):
+        """Index a session's chats, resolve its target channel and register its handlers."""
+        client = session.client
+        
+        # The dialog index is kept current from membership updates. A saved
+        # index is used right away but misses what changed while we were
+        # offline, so it is reconciled with GetDialogs in the background
+        if not session.dialogs.load():
+            await self.refresh_dialog_index(session)
+        else:
+            self._run_in_background(self._reconcile_dialog_index(session))
+        client.add_event_handler(functools.partial(self._on_chat_action, session), events.ChatAction())
+        client.add_event_handler(
+            functools.partial(self._on_channel_update, session),
+            events.Raw(types=[UpdateChannel, UpdateChannelParticipant])
+        )
+        
+        # Resolve the target channel once instead of on every forward; access
+        # hashes differ between accounts, so every session resolves it itself
+        try:
+            if session is self.pool.primary:
+                session.target = await self.resolve_entity(self.target_channel_id())
+            else:
+                session.target = await client.get_input_entity(self.target_channel_id())
+        except Exception as e:
+            logger.warning(f"⚠️ Session {session.name} could not resolve target channel: {str(e)}")
+            session.target = None
+        
         # Register message handler for keyword monitoring
-        self.client.add_event_handler(
-            self.keyword_monitor,
+        client.add_event_handler(
+            functools.partial(self._on_new_message, session),
             events.NewMessage(incoming=True, outgoing=False, chats=None)
         )
-        
-        print("🟢 UserBot has started successfully!")
-        return self.client
     
     async def stop(self):
         """Stop the UserBot client."""
         if self.client:
-            await self.client.disconnect()
+            # A running scan is paused here and resumed on the next start
+            await self.scanner.stop()
+            if self._analytics_task is not None:
+                self._analytics_task.cancel()
+                await asyncio.gather(self._analytics_task, return_exceptions=True)
+                self._analytics_task = None
+            # Deliver matches that are still queued before disconnecting
+            await self.forwarder.drain(config.FORWARD_DRAIN_TIMEOUT)
+            await self.digest.close()
+            await self.forward_batcher.close()
+            await config.STORE.flush_matches()
+            await self.save_analytics()
+            # A running broadcast is paused here and resumed on the next start
+            await self.broadcaster.stop()
+            await self.pool.stop()
             self.running = False
-            print("🔴 UserBot has been stopped.")
+            logger.info("🔴 UserBot has been stopped.")
+    
+    @staticmethod
+    def target_channel_id():
+        """Return config.TARGET_CHANNEL with the -100 channel prefix applied."""
+        target_channel = config.TARGET_CHANNEL
+        
+        # For channels/supergroups, IDs should start with -100
+        if target_channel < 0 and not str(target_channel).startswith('-100'):
+            # Remove negative sign and add -100 prefix
+            target_channel = int(f"-100{str(abs(target_channel))}")
+        return target_channel
+    
+    @staticmethod
+    def message_link(chat_id, message_id):
+        """t.me link to a message in a supergroup/channel; None for other chats."""
+        if chat_id is None or not str(chat_id).startswith("-100"):
+            return None
+        return f"https://t.me/c/{str(chat_id)[4:]}/{message_id}"
+    
+    @staticmethod
+    def _entity_key(target):
+        """Turn a user supplied ID or username into a cache key."""
+        if isinstance(target, int):
+            return target
+        target = target.strip()
+        if target.isdigit() or (target.startswith("-") and target[1:].isdigit()):
+            return int(target)
+        # Usernames are case-insensitive and may be given with or without @
+        return (target[1:] if target.startswith("@") else target).lower()
+    
+    async def resolve_entity(self, target):
+        """Resolve an ID or username to an entity, using the entity cache.
+        
+        Concurrent lookups of the same key share one request.
+        """
+        key = self._entity_key(target)
+        entity = self.entity_cache.get(key)
+        if entity is not None:
+            return entity
+        
+        pending = self._pending_lookups.get(key)
+        if pending is not None:
+            return await pending
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending_lookups[key] = future
+        try:
+            entity = await self.client.get_entity(key)
+            self.entity_cache.set(key, entity)
+            # Also cache by marked peer ID so later lookups by either form hit
+            try:
+                self.entity_cache.set(utils.get_peer_id(entity), entity)
+            except TypeError:
+                pass
+            future.set_result(entity)
+            return entity
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved if nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._pending_lookups[key]
+    
+    async def resolve_chat_id(self, target):
+        """Return the marked chat ID for a numeric ID or a username."""
+        key = self._entity_key(target)
+        if isinstance(key, int):
+            return key
+        return utils.get_peer_id(await self.resolve_entity(key))
+    
+    async def refresh_dialog_index(self, session=None):
+        """Rebuild a session's dialog index (the primary's by default) from its full dialog list."""
+        session = session or self.pool.primary
+        entities = []
+        async for dialog in session.client.iter_dialogs():
+            if dialog.is_group or dialog.is_channel:
+                entities.append(dialog.entity)
+        session.dialogs.replace_all(entities)
+        logger.info(f"📇 Dialog index of {session.name} built with {len(session.dialogs)} groups/channels")
+    
+    async def _reconcile_dialog_index(self, session):
+        """Refresh a session's saved dialog index after startup."""
+        try:
+            await self.refresh_dialog_index(session)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not reconcile the dialog index of {session.name}: {str(e)}")
+    
+    async def _on_new_message(self, session, event):
+        """Monitor a message once, however many sessions are in its chat."""
+        if self.pool.claim(event):
+            await self.keyword_monitor(event)
+    
+    async def _on_chat_action(self, session, event):
+        """Keep the session's dialog index current when it joins, leaves or a title changes."""
+        if event.is_private:
+            return
+        
+        if event.new_title and event.chat_id in session.dialogs:
+            session.dialogs.update_entity(await event.get_chat())
+            return
+        
+        if not (event.user_joined or event.user_added or event.user_left or event.user_kicked):
+            return
+        if session.me_id not in (event.user_ids or []):
+            return
+        
+        self.entity_cache.invalidate(event.chat_id)
+        if event.user_left or event.user_kicked:
+            session.dialogs.remove(event.chat_id)
+        else:
+            session.dialogs.update_entity(await event.get_chat())
+    
+    async def _on_channel_update(self, session, update):
+        """Refresh a channel in the session's dialog index after its membership in it changed."""
+        if isinstance(update, UpdateChannelParticipant) and update.user_id != session.me_id:
+            return
+        
+        peer = PeerChannel(update.channel_id)
+        chat_id = utils.get_peer_id(peer)
+        self.entity_cache.invalidate(chat_id)
+        try:
+            entity = await session.client.get_entity(peer)
+        except (ChannelPrivateError, ValueError):
+            # Kicked, banned or the channel became private to us
+            session.dialogs.remove(chat_id)
+            return
+        except Exception as e:
+            logger.warning(f"⚠️ Could not refresh channel {chat_id} in the dialog index of {session.name}: {str(e)}")
+            return
+        session.dialogs.update_entity(entity)
+    
+    async def set_digest_mode(self, enabled, window=None):
+        """Switch digest mode on or off at runtime.
+        
+        Turning it off flushes whatever is still buffered.
+        """
+        if window is not None:
+            self.digest.window = window
+        self.digest_enabled = enabled
+        if not enabled:
+            await self.digest.close()
+    
+    async def reload_keywords(self):
+        """Rebuild the keyword matcher if the stored keywords changed.
+
+        Only a changed keyword version triggers a rebuild. The new matchers
+        are compiled in a worker thread, so large lists don't stall message
+        handling, and then swapped in with single assignments; messages being
+        handled keep using a complete matcher. Returns True if rebuilt.
+        """
+        async with self._reload_lock:
+            version = config.STORE.version('keywords')
+            if version == self.keywords_version:
+                return False
+            keywords = config.STORE.keywords()
+            scopes = self.chat_filters.scopes
+            
+            # The worker thread only compiles; the filters are read and changed
+            # on the event loop, so the results are installed here
+            def build():
+                return KeywordMatcher(keywords), ChatFilters.build_matchers(scopes, keywords)
+            
+            matcher, scoped = await asyncio.get_running_loop().run_in_executor(None, build)
+            self.matcher = matcher
+            if not self.chat_filters.set_matchers(scopes, scoped):
+                # A scope was changed while compiling
+                self.chat_filters.rebuild(keywords)
+            config.KEYWORDS = keywords
+            self.keywords_version = version
+            self.analytics.retain_keywords(keywords)
+            logger.info(f"🔑 Keyword matcher rebuilt with {len(self.matcher)} keywords")
+            return True
     
     async def keyword_monitor(self, event):
         """Monitor messages for keywords and forward them if matched."""
+        metrics.MESSAGES_SEEN.inc()
+        await self.process_message(event)
+    
+    async def process_message(self, event, forward=True):
+        """Match one message and forward it, or with ``forward=False`` only record it.
+        
+        Used for live messages and by the history scanner. Returns True on a match.
+        """
+        # Cheapest checks first: denied/not allowed chats cost one set lookup
+        chat_id = event.chat_id
+        if not self.chat_filters.is_monitored(chat_id):
+            return False
+        
         # Skip if message is from a private chat
         if event.is_private:
-            return
+            return False
         
         # Get the text message
         message_text = event.message.text or event.message.caption or ""
         if not message_text:
-            return
+            return False
             
-        # Check if message contains any of the keywords
-        for keyword in config.KEYWORDS:
-            if re.search(rf'\b{re.escape(keyword)}\b', message_text, re.IGNORECASE):
-                try:
-                    # Get sender information
-                    sender = await event.get_sender()
-                    chat = await event.get_chat()
-                    
-                    # Prepare user information
-                    sender_name = ""
-                    username = "غير متوفر"
-                    user_id = 0
-                    
-                    if isinstance(sender, User):
-                        user_id = sender.id
-                        sender_name = f"{sender.first_name} {sender.last_name if sender.last_name else ''}"
-                        username = f"@{sender.username}" if sender.username else "غير متوفر"
-                    
-                    # Get message link
-                    try:
-                        message_link = f"https://t.me/c/{str(event.chat_id)[4:]}/{event.message.id}" if str(event.chat_id).startswith("-100") else "غير متوفر"
-                    except:
-                        message_link = "غير متوفر"
-                    
-                    # Format the forwarded message
-                    formatted_message = config.MESSAGE_FORWARD_FORMAT.format(
-                        message=message_text,
-                        sender_name=sender_name.strip(),
-                        username=username,
-                        user_id=user_id,
-                        message_link=message_link,
-                        date=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    )
-                    
-                    # Send the formatted message to the target channel
-                    try:
-                        # Make sure the target channel ID has the correct format
-                        target_channel = config.TARGET_CHANNEL
-                        
-                        # For channels/supergroups, IDs should start with -100
-                        # Convert if needed
-                        if target_channel < 0 and not str(target_channel).startswith('-100'):
-                            # Remove negative sign and add -100 prefix
-                            target_channel = int(f"-100{str(abs(target_channel))}")
-                        
-                        # Try to send the message using the entity object instead of direct ID
-                        try:
-                            # Get entity first
-                            entity = await self.client.get_entity(target_channel)
-                            await self.client.send_message(entity, formatted_message)
-                            print(f"🔄 Forwarded message containing keyword '{keyword}' to target channel")
-                        except Exception as e1:
-                            # Fallback to direct ID
-                            await self.client.send_message(target_channel, formatted_message)
-                            print(f"🔄 Forwarded message containing keyword '{keyword}' to target channel")
-                    except Exception as e:
-                        print(f"❌ Error forwarding message: {str(e)}")
-                    break
-                    
-                except Exception as e:
-                    print(f"❌ Error forwarding message: {str(e)}")
-                break
+        # Normalize once and scan the message once for all keywords
+        match_started = time.perf_counter()
+        normalized = normalize_text(message_text)
+        # An empty scoped matcher is falsy but must still win over the global one
+        matcher = self.chat_filters.matcher_for(chat_id)
+        if matcher is None:
+            matcher = self.matcher
+        hits = matcher.find_all_normalized(message_text, normalized)
+        metrics.MATCH_SECONDS.observe(time.perf_counter() - match_started)
+        if not hits:
+            return False
+        metrics.MESSAGES_MATCHED.inc()
+        
+        # Every hit counts, duplicates included; scanned history lands in the
+        # window its messages were sent in
+        keywords = list(dict.fromkeys(hit.keyword for hit in hits))
+        date = getattr(event.message, 'date', None)
+        self.analytics.record(chat_id, keywords, date.timestamp() if date else None)
+        
+        # Content cross-posted to several groups is only forwarded once; if the
+        # first forward is given up on, the fingerprint is forgotten again
+        dedup_entry = None
+        if self.dedup is not None and forward:
+            media = event.message.photo or event.message.document
+            key = DuplicateFilter.fingerprint(normalized, media.id if media else None)
+            dedup_entry, is_duplicate = self.dedup.check(key, chat_id)
+            if is_duplicate:
+                match_logger.debug(
+                    f"Suppressed duplicate match in chat {chat_id}",
+                    extra={'event': 'duplicate', 'chat_id': chat_id, 'hits': dedup_entry.count}
+                )
+                self._schedule_dedup_edit(dedup_entry)
+                return True
+        
+        # Keep the sender and chat that arrived with the update for enrichment;
+        # these properties never go to the network
+        self.metadata.remember(event.sender)
+        self.metadata.remember(event.chat)
+        
+        # Hand the match over to the forwarder so delivery never blocks ingestion
+        match_logger.info(
+            f"🔍 Keyword match in chat {chat_id}",
+            extra={
+                'event': 'match',
+                'chat_id': chat_id,
+                'message_id': event.message.id,
+                'keywords': keywords,
+                'offsets': [(hit.start, hit.end) for hit in hits],
+            }
+        )
+        if forward:
+            await self.forwarder.submit(ForwardJob(event, message_text, keywords, dedup_entry))
+        self._record_match(event, keywords, message_text)
+        return True
+    
+    async def save_analytics(self):
+        """Write the hit counters changed since the last save in one batch."""
+        rows = self.analytics.dirty_rows()
+        if not rows:
+            return
+        try:
+            await config.STORE.save_hit_counters(rows)
+        except Exception as e:
+            self.analytics.mark_dirty(rows)
+            logger.warning(f"⚠️ Could not save hit counters: {str(e)}")
+    
+    async def _save_analytics_periodically(self):
+        while True:
+            await asyncio.sleep(config.ANALYTICS_FLUSH_INTERVAL)
+            await self.save_analytics()
+    
+    def chat_title(self, chat_id):
+        """Best known title of a chat without a request, or None."""
+        chat = self.metadata.get_chat(chat_id)
+        if chat is not None:
+            return chat.title
+        for session in self.pool.running:
+            entry = session.dialogs.get(chat_id)
+            if entry is not None:
+                return entry.title
+        return None
+    
+    def _run_in_background(self, coroutine):
+        """Run a coroutine as a task that is kept referenced until it finishes."""
+        task = asyncio.create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    def _record_match(self, event, keywords, message_text):
+        """Queue a match for the history; it is written in a batch on the storage thread."""
+        sender = self.metadata.senders.get_recent(event.sender_id) if event.sender_id is not None else None
+        chat = self.metadata.get_chat(event.chat_id)
+        date = getattr(event.message, 'date', None)
+        try:
+            config.STORE.record_match(
+                event.chat_id, event.message.id, event.sender_id, keywords, message_text,
+                chat_title=chat.title if chat else None,
+                sender_name=sender.name.strip() if sender else None,
+                matched_at=date.timestamp() if date else None,
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Could not record match in history: {str(e)}")
+    
+    def _forget_duplicate(self, entry):
+        """Let the next copy of undelivered content through the duplicate filter."""
+        if entry is not None and self.dedup is not None:
+            self.dedup.forget(entry)
+    
+    def _schedule_dedup_edit(self, entry):
+        """Edit the hit count into an already sent forward, at most once per DEDUP_EDIT_DELAY."""
+        if entry.message_id is None or entry.edit_pending:
+            return
+        entry.edit_pending = True
+        self._run_in_background(self._edit_dedup_annotation(entry))
+    
+    async def _edit_dedup_annotation(self, entry):
+        """Wait for a burst of duplicates to settle, then update the forward once."""
+        await asyncio.sleep(config.DEDUP_EDIT_DELAY)
+        entry.edit_pending = False
+        annotation = config.DEDUP_ANNOTATION.format(count=entry.count, chats=len(entry.chats))
+        text = entry.text
+        if len(text) + len(annotation) > MAX_MESSAGE_LENGTH:
+            text = text[:MAX_MESSAGE_LENGTH - len(annotation) - 1] + "…"
+        try:
+            # Only the session that sent the forward may edit it
+            session = self.pool.get(entry.session) or self.pool.primary
+            target = session.target or self.target_channel_id()
+            await session.client.edit_message(target, entry.message_id, text + annotation)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not update duplicate count on forwarded message: {str(e)}")
+    
+    async def _deliver_match(self, job):
+        """Format a queued match and send it to the target channel.
+        
+        Errors are left to the forwarder, which retries or pauses as needed.
+        """
+        event = job.event
+        keyword = ", ".join(job.keywords)
+        
+        # Sender information comes from the metadata cache; unknown senders
+        # are looked up in batches shared with other matches
+        sender = None
+        if event.sender_id is not None:
+            # Access hashes are per account; lookups run on the primary session
+            input_sender = self._input_sender(event) if getattr(event, 'client', self.client) is self.client else None
+            sender = await self.metadata.get_sender(event.sender_id, input_sender)
+        chat = self.metadata.get_chat(event.chat_id)
+        
+        # Prepare user information
+        sender_name = ""
+        username = "غير متوفر"
+        user_id = 0
+        chat_title = chat.title if chat else ""
+        
+        if sender is not None:
+            user_id = sender.user_id
+            sender_name = sender.name
+            username = f"@{sender.username}" if sender.username else "غير متوفر"
+        
+        # Get message link
+        message_link = self.message_link(event.chat_id, event.message.id) or "غير متوفر"
+        
+        if self.digest_enabled:
+            message = job.message_text
+            if len(message) > config.DIGEST_MESSAGE_PREVIEW:
+                message = message[:config.DIGEST_MESSAGE_PREVIEW] + "…"
+            await self.digest.add(config.DIGEST_ENTRY_FORMAT.format(
+                keyword=keyword,
+                message=message,
+                sender_name=sender_name.strip(),
+                username=username,
+                user_id=user_id,
+                chat_title=chat_title,
+                message_link=message_link,
+            ))
+            return
+        
+        if self.native_forward and not job.copy and event.chat_id not in self.forward_batcher.restricted:
+            note = None
+            if config.NATIVE_FORWARD_NOTE_FORMAT:
+                note = config.NATIVE_FORWARD_NOTE_FORMAT.format(
+                    keyword=keyword,
+                    sender_name=sender_name.strip(),
+                    username=username,
+                    user_id=user_id,
+                    chat_title=chat_title,
+                    message_link=message_link,
+                )
+            # Sent together with the other matches from this chat; the
+            # batcher retries on its own, like the digest buffer
+            await self.forward_batcher.add(event.chat_id, ForwardItem(event, note, job.queued_at, job.dedup, job))
+            return
+        
+        # Format the forwarded message
+        formatted_message = config.MESSAGE_FORWARD_FORMAT.format(
+            message=job.message_text,
+            sender_name=sender_name.strip(),
+            username=username,
+            user_id=user_id,
+            chat_title=chat_title,
+            message_link=message_link,
+            date=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        )
+        
+        # Send the formatted message to the target channel
+        session, sent = await self._send_forward(formatted_message)
+        latency = time.monotonic() - job.queued_at
+        metrics.FORWARDS_SENT.inc()
+        metrics.FORWARD_LATENCY_SECONDS.observe(latency)
+        match_logger.info(
+            f"🔄 Forwarded message containing keyword '{keyword}' to target channel",
+            extra={
+                'event': 'forward',
+                'chat_id': event.chat_id,
+                'message_id': event.message.id,
+                'keywords': job.keywords,
+                'attempts': job.attempts,
+                'latency_ms': round(latency * 1000, 1),
+            }
+        )
+        
+        # Remember the forward so later duplicates can update its hit count
+        if job.dedup is not None:
+            job.dedup.message_id = sent.id
+            job.dedup.text = formatted_message
+            job.dedup.session = session.name
+            if job.dedup.count > 1:
+                self._schedule_dedup_edit(job.dedup)
+    
+    async def _forward_batch(self, chat_id, items):
+        """Forward a source chat's matched messages in one request, then reply with their notes."""
+        message_ids = [item.message_id for item in items]
+        event = items[-1].event
+        
+        def eligible(session):
+            # The session must be able to see the source chat
+            if chat_id not in session.dialogs and getattr(event, 'client', self.client) is not session.client:
+                return False
+            return session.target is not None or session is self.pool.primary
+        
+        async def forward(session):
+            entry = session.dialogs.get(chat_id)
+            source = entry.input_peer() if entry else (event.input_chat or chat_id)
+            target = session.target or self.target_channel_id()
+            return session, await session.client.forward_messages(target, message_ids, source)
+        
+        session, forwarded = await self.pool.run(forward, eligible=eligible)
+        match_logger.info(
+            f"🔄 Forwarded {len(message_ids)} matched messages from chat {chat_id}",
+            extra={'event': 'forward', 'chat_id': chat_id, 'message_ids': message_ids}
+        )
+        
+        # The notes are a courtesy: failing to send them must not resend the forwards
+        notes = [item.note for item in items if item.note]
+        first = next((message for message in forwarded or [] if message is not None), None)
+        if notes and first is not None:
+            try:
+                await session.client.send_message(
+                    session.target or self.target_channel_id(),
+                    "\n".join(notes)[:MAX_MESSAGE_LENGTH],
+                    reply_to=first.id
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Could not send notes for forwarded messages: {str(e)}")
+    
+    async def _copy_forward_items(self, chat_id, items):
+        """Deliver messages that can't be forwarded natively as copies with a link."""
+        # Not through the queue: this may run on a forwarder worker or during
+        # shutdown, after the workers are gone
+        for item in items:
+            item.job.copy = True
+            item.job.attempts = 0
+            await self.forwarder.deliver_now(item.job)
+    
+    async def _call(self, request):
+        """Invoke a raw API request on the current client."""
+        return await self.client(request)
+    
+    @staticmethod
+    def _input_sender(event):
+        """InputUser for the sender from locally cached data only, or None.
+        
+        Falls back to referencing the user through the message it sent when
+        we have never seen the sender's access hash.
+        """
+        if event.sender_id is None or event.sender_id < 0:
+            return None  # Channel senders don't need a user lookup
+        peer = event.input_sender
+        if isinstance(peer, InputPeerUser):
+            return InputUser(peer.user_id, peer.access_hash)
+        if event.input_chat is not None:
+            return InputUserFromMessage(event.input_chat, event.message.id, event.sender_id)
+        return None
+    
+    async def _send_forward(self, text):
+        """Send text to the target channel through the session with the most spare budget.
+        
+        Returns ``(session, message)``.
+        """
+        async def send(session):
+            target = session.target or self.target_channel_id()
+            return session, await session.client.send_message(target, text)
+        return await self.pool.run(
+            send, eligible=lambda session: session.target is not None or session is self.pool.primary
+        )
+    
+    async def _send_to_target(self, text):
+        """Send text to the target channel."""
+        session, sent = await self._send_forward(text)
+        return sent
     
     async def status(self):
-        """Check connection status of UserBot."""
+        """Check connection status of UserBot, one line per session."""
         if not self.running or not self.client:
             return "UserBot is not running."
             
         try:
-            me = await self.client.get_me()
-            return f"✅ UserBot is running!\nConnected as: {me.first_name} (@{me.username if me.username else 'No username'}) - ID: {me.id}"
+            return "✅ UserBot is running!\n" + self.pool.status_text()
         except Exception as e:
             return f"❌ Error checking UserBot status: {str(e)}"
     
@@ -129,59 +712,156 @@ class UserBot:
             return "❌ UserBot is not running."
             
         try:
-            # Check if target is a numeric ID or a username
-            if target.isdigit() or (target.startswith("-") and target[1:].isdigit()):
-                target_id = int(target)
-                entity = await self.client.get_entity(target_id)
+            key = self._entity_key(target)
+            members = self.pool.members(key) if isinstance(key, int) else []
+            if members:
+                # Known groups/channels come straight from the dialog index
+                # of any session that is in them
+                await self.pool.run(
+                    lambda session: session.client.send_message(session.dialogs.get(key).input_peer(), message),
+                    eligible=lambda session: session in members
+                )
+            elif isinstance(key, int):
+                # Other numeric IDs need an access hash only the primary may know
+                entity = await self.resolve_entity(key)
+                await self.pool.run(
+                    lambda session: session.client.send_message(entity, message),
+                    eligible=lambda session: session is self.pool.primary
+                )
             else:
-                # If not numeric, treat as username (with or without @)
-                username = target[1:] if target.startswith("@") else target
-                entity = await self.client.get_entity(username)
-                
-            # Send message
-            await self.client.send_message(entity, message)
+                # Usernames (with or without @) are resolved by the sending session
+                async def send(session):
+                    entity = await self.resolve_entity(key) if session is self.pool.primary else key
+                    await session.client.send_message(entity, message)
+                await self.pool.run(send)
             return f"✅ Message sent successfully to {target}"
             
         except Exception as e:
             return f"❌ Error sending message: {str(e)}"
     
-    async def broadcast(self, message):
-        """Send a message to all groups the user is in."""
+    async def broadcast(self, message, on_done=None):
+        """Start a background broadcast of a message to all groups the user is in.
+        
+        ``on_done`` is awaited with the finished job so the caller can report the result.
+        """
         if not self.running:
             return "❌ UserBot is not running."
+        
+        if self.broadcaster.running:
+            return "❌ A broadcast is already running.\n" + self.broadcaster.progress_text()
             
         try:
-            count = 0
-            failed = 0
-            
-            # Get all dialogs (chats, groups, channels)
-            async for dialog in self.client.iter_dialogs():
-                # Check if it's a group or channel
-                if dialog.is_group or dialog.is_channel:
-                    try:
-                        # Try to send message
-                        await self.client.send_message(dialog.entity, message)
-                        count += 1
-                        await asyncio.sleep(0.5)  # Short delay to avoid flood limits
-                    except Exception:
-                        failed += 1
+            # Every group/channel any session can post in, straight from the dialog indexes
+            targets = list(dict.fromkeys(
+                entry.chat_id for session in self.pool.running for entry in session.dialogs.writable()
+            ))
             
-            return f"✅ Broadcast complete: Sent to {count} groups/channels, failed in {failed} groups/channels."
+            job = self.broadcaster.start_job(message, targets, on_done)
+            return f"✅ Broadcast {job.job_id} started to {job.total} groups/channels."
             
         except Exception as e:
             return f"❌ Error during broadcast: {str(e)}"
     
+    def broadcast_status(self):
+        """Report the progress of the current or last broadcast."""
+        return self.broadcaster.progress_text()
+    
+    def cancel_broadcast(self):
+        """Cancel the running broadcast."""
+        if self.broadcaster.cancel():
+            return "✅ Broadcast cancelled.\n" + self.broadcaster.progress_text()
+        return "⚠️ No broadcast is running."
+    
+    async def _send_broadcast(self, chat_id, message):
+        """Send one broadcast message; errors are handled by the broadcast engine.
+        
+        The message goes out through a session that can post in the chat,
+        preferring the one with the most spare budget.
+        """
+        def can_post(session):
+            entry = session.dialogs.get(chat_id)
+            return entry is not None and entry.writable
+        
+        async def send(session):
+            entry = session.dialogs.get(chat_id)
+            await session.client.send_message(entry.input_peer() if entry else chat_id, message)
+        
+        if not any(can_post(session) for session in self.pool.running):
+            # Not in any index (e.g. a resumed job); let the primary try the raw ID
+            await self.pool.run(send, eligible=lambda session: session is self.pool.primary)
+            return
+        await self.pool.run(send, eligible=can_post)
+    
+    async def _iter_history(self, chat_id, since, offset_id):
+        """Stream a chat's messages oldest first, after ``offset_id`` or else after ``since``."""
+        members = self.pool.members(chat_id)
+        session = members[0] if members else self.pool.primary
+        entry = session.dialogs.get(chat_id)
+        peer = entry.input_peer() if entry else await self.resolve_entity(chat_id)
+        
+        # With reverse=True both offsets mean "newer than"; the scanner does
+        # its own pacing, so Telethon need not sleep between chunks
+        if offset_id:
+            offset = {'offset_id': offset_id}
+        else:
+            offset = {'offset_date': datetime.fromtimestamp(since, timezone.utc)}
+        async for message in session.client.iter_messages(peer, reverse=True, wait_time=0, **offset):
+            yield message
+    
+    async def scan_history(self, target, since, on_done=None):
+        """Start a background scan of past messages in one chat, or 'all' indexed chats.
+        
+        ``on_done`` is awaited with the finished job so the caller can report the result.
+        """
+        if not self.running:
+            return "❌ UserBot is not running."
+        
+        if self.scanner.running:
+            return "❌ A scan is already running.\n" + self.scanner.progress_text()
+        
+        try:
+            since_ts = parse_since(since)
+            if target.lower() == 'all':
+                # Every indexed group/channel that is monitored at all
+                chats = [
+                    entry.chat_id for session in self.pool.running for entry in session.dialogs
+                    if self.chat_filters.is_monitored(entry.chat_id)
+                ]
+            else:
+                chats = [await self.resolve_chat_id(target)]
+            
+            job = await self.scanner.start_job(chats, since_ts, on_done)
+            return f"✅ Scan {job.job_id} started for {job.total} groups/channels."
+            
+        except Exception as e:
+            return f"❌ Error starting scan: {str(e)}"
+    
+    def scan_status(self):
+        """Report the progress of the current or last scan."""
+        return self.scanner.progress_text()
+    
+    def cancel_scan(self):
+        """Cancel the running scan."""
+        if self.scanner.cancel():
+            return "✅ Scan cancelled.\n" + self.scanner.progress_text()
+        return "⚠️ No scan is running."
+    
     async def join_group(self, link):
         """Join a group or channel using an invite link or username."""
         if not self.running:
             return "❌ UserBot is not running."
             
         try:
+            # New chats go to the session that is in the fewest chats
+            session = self.pool.least_loaded()
+            
             # Check if it's an invite link with hash
             hash_match = re.search(r't\.me/\+([a-zA-Z0-9_-]+)', link)
             if hash_match:
                 invite_hash = hash_match.group(1)
-                await self.client(ImportChatInviteRequest(invite_hash))
+                result = await session.client(ImportChatInviteRequest(invite_hash))
+                for chat in getattr(result, 'chats', []):
+                    session.dialogs.update_entity(chat)
                 return f"✅ Successfully joined the group via invite link."
             
             # Check if it's a public username link or just username
@@ -195,8 +875,10 @@ class UserBot:
                 username = link[1:] if link.startswith("@") else link
             
             if username:
-                entity = await self.client.get_entity(username)
-                await self.client(JoinChannelRequest(entity))
+                entity = await session.client.get_entity(username)
+                result = await session.client(JoinChannelRequest(entity))
+                for chat in getattr(result, 'chats', []):
+                    session.dialogs.update_entity(chat)
                 return f"✅ Successfully joined {username}."
             
             return "❌ Invalid link format. Please use a t.me link or a username."
@@ -210,20 +892,34 @@ class UserBot:
             return "❌ UserBot is not running."
             
         try:
-            # Convert string to integer if it's a numeric ID
-            if chat_id.isdigit() or (chat_id.startswith("-") and chat_id[1:].isdigit()):
-                chat_id = int(chat_id)
-            else:
-                # If not numeric, treat as username
-                entity = await self.client.get_entity(chat_id)
-                chat_id = entity.id
+            key = self._entity_key(chat_id)
+            
+            # Chats we are in are known to the dialog indexes, no lookup
+            # needed; every session in the chat leaves it
+            members = self.pool.members(key) if isinstance(key, int) else []
+            for session in members:
+                entry = session.dialogs.get(key)
+                peer = entry.input_peer()
+                if entry.type == 'group':
+                    await session.client(DeleteChatUserRequest(peer.chat_id, InputUserSelf()))
+                else:
+                    await session.client(LeaveChannelRequest(peer))
+                session.dialogs.remove(entry.chat_id)
+            if members:
+                self.entity_cache.invalidate(key)
+                return f"✅ Successfully left the chat with ID {chat_id}"
             
-            # Get the entity
-            entity = await self.client.get_entity(chat_id)
+            # Otherwise resolve the ID or username once
+            entity = await self.resolve_entity(key)
+            chat_id = entity.id
             
             # Leave the chat
             if isinstance(entity, (Channel, Chat)):
                 await self.client(LeaveChannelRequest(entity))
+                # Our membership changed, so drop the stale cached entity
+                self.entity_cache.invalidate(key)
+                self.entity_cache.invalidate(utils.get_peer_id(entity))
+                self.pool.primary.dialogs.remove(utils.get_peer_id(entity))
                 return f"✅ Successfully left the chat with ID {chat_id}"
             else:
                 return "❌ This is not a group or channel."
@@ -237,14 +933,8 @@ class UserBot:
             return "❌ UserBot is not running."
             
         try:
-            # Check if it's a user ID or username
-            if user_id_or_username.isdigit():
-                user_id = int(user_id_or_username)
-                entity = await self.client.get_entity(user_id)
-            else:
-                # If not numeric, treat as username (with or without @)
-                username = user_id_or_username[1:] if user_id_or_username.startswith("@") else user_id_or_username
-                entity = await self.client.get_entity(username)
+            # Numeric IDs and usernames (with or without @) are both accepted
+            entity = await self.resolve_entity(user_id_or_username)
             
             # Get user information
             if isinstance(entity, User):